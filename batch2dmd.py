@@ -1,89 +1,64 @@
-from PIL import Image, ImageOps
-import sys
 import os
-import statistics
 import argparse
 
+from dmdbatch import build_directory, alpha_name
+from dmdcache import default_cache_dir
+from dmdcore import parse_size, parse_timemult, PAGE_SIZE, RESIZE_POLICIES, DITHER_MODES, MAX_DEPTH, FORMAT_V2, FORMAT_V3
+import dmdprofile
+
 
 parser = argparse.ArgumentParser(description='Convert raster images to DMD')
 parser.add_argument('ext_in', help='Input File extensions')
 parser.add_argument('--dir-in', help='directory', default=os.path.curdir)
 parser.add_argument('--dir-out', help='directory', default=os.path.curdir)
 parser.add_argument('--alpha', help='convert 0000-9999 to aaaa-jjjj', default=False, type=bool)
+parser.add_argument('--threshold', help='on/off threshold (0~255)', default=100, type=int)
+parser.add_argument('--invert', help='invert on/off pixels', default=False, type=bool)
+parser.add_argument('--timemult', help='page time multiplier (0~255)', default=1, type=parse_timemult)
+parser.add_argument('--jobs', help='worker processes (default: CPU count)', default=None, type=int)
+parser.add_argument('--force', help='ignore the manifest and convert every file', action='store_true')
+parser.add_argument('--no-cache', help='bypass the conversion cache', action='store_true')
+parser.add_argument('--legacy', help='write DMD v2 pages for older loaders', action='store_true')
+parser.add_argument('--size', help='page size, WIDTHxHEIGHT (default: 32x32)', default=PAGE_SIZE, type=parse_size)
+parser.add_argument('--resize', help='fit, fill or crop sources that aren\'t the page size', default='fit',
+                    choices=RESIZE_POLICIES)
+parser.add_argument('--dither', help='dithering instead of a plain threshold', default='none', choices=DITHER_MODES)
+parser.add_argument('--depth', help='bits per pixel, over 1 writes multi-level (grayscale) v3 pages', default=1,
+                    type=int, choices=range(1, MAX_DEPTH + 1), metavar='BITS')
+dmdprofile.add_argument(parser)
 
 args = parser.parse_args()
+if args.depth > 1 and args.dither != 'none':
+    parser.error("--dither makes 1 bit pages, it can't be combined with --depth")
+if args.legacy and tuple(args.size) != PAGE_SIZE:
+    parser.error(f"DMD v2 pages are {PAGE_SIZE[0]}x{PAGE_SIZE[1]}, --legacy can't be combined with --size")
+if args.legacy and args.depth > 1:
+    parser.error("DMD v2 pages are 1 bit per pixel, --legacy can't be combined with --depth")
+dmdprofile.enable_from_args(args)
 
 
-def remove_transparency(im, bg_colour=(255, 255, 255)):
-    # Only process if image has transparency (http://stackoverflow.com/a/1963146)
-    if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
-
-        # Need to convert to RGBA if LA format due to a bug in PIL (http://stackoverflow.com/a/1963146)
-        alpha = im.convert('RGBA').split()[-1]
-
-        # Create a new background image of our matt color.
-        # Must be RGBA because paste requires both images to have the same format
-        # (http://stackoverflow.com/a/8720632  and  http://stackoverflow.com/a/9459208)
-        bg = Image.new("RGBA", im.size, bg_colour + (255,))
-        bg.paste(im, mask=alpha)
-        return bg
-
-    else:
-        return im
-
-
-def slice_per(source, step):
-    return [source[i::step] for i in range(step)]
-
-
-def flatten(li):
-    return [item for sublist in li for item in sublist]
-
-
-def convert(in_file, output):
-    image = Image.open(in_file)
+def output_name(file):
+    name = file.replace(args.ext_in, '') + "dmd"
+    if args.alpha:
+        name = alpha_name(name)
+    return name
 
-    image = remove_transparency(image, (0, 0, 0))
-    image = image.convert("RGB")
 
-    raw_data = slice_per(list(image.getdata()), 32)
-
-    for yi, y in enumerate(raw_data):
-        for xi, x in enumerate(y):
-            threshold = 100
-
-            if statistics.mean(x) > threshold:
-                raw_data[yi][xi] = (255, 255, 255)
-            else:
-                raw_data[yi][xi] = (0, 0, 0)
-
-    image = Image.new(image.mode, image.size)
-    image.putdata(flatten(raw_data))
-    image = image.rotate(-90)
-    image = ImageOps.mirror(image)
-
-    data = list(image.getdata())
-
-    for index, pixel in enumerate(data):
-        if pixel == (255, 255, 255):
-            data[index] = 0x01
+if __name__ == "__main__":
+    targets = {file: (os.path.join(args.dir_in, file), output_name(file))
+               for file in sorted(os.listdir(args.dir_in)) if file.endswith(args.ext_in)}
+
+    counts = {"converted": 0, "failed": 0, "removed": 0}
+    for action, name, error in build_directory(targets, args.dir_out, args.threshold, args.invert, args.timemult,
+                                               args.jobs, args.force, lambda file: file.endswith(args.ext_in),
+                                               None if args.no_cache else default_cache_dir(),
+                                               FORMAT_V2 if args.legacy else FORMAT_V3, args.size, args.resize,
+                                               args.dither, args.depth):
+        counts[action] += 1
+        if error:
+            print(f"{name}: {error}")
         else:
-            data[index] = 0x00
-
-    data.insert(0, 1)
-
-    with open(output, "wb") as file:
-        file.write(bytes(data))
+            print(f"{action} {name}")
 
-
-if __name__ == "__main__":
-    for file in os.listdir(args.dir_in):
-        print(file)
-        if file.endswith(args.ext_in):
-            convert(os.path.join(args.dir_in, file), os.path.join(args.dir_out, file.replace(args.ext_in, '') + "dmd"))
-            if args.alpha:
-                os.rename(os.path.join(args.dir_out, file.replace(args.ext_in, '') + "dmd"),
-                          os.path.join(args.dir_out, file.replace(args.ext_in, '') + "dmd")
-                          .replace('0', 'a').replace('1', 'b').replace('2', 'c').replace('3', 'd')
-                          .replace('4', 'e').replace('5', 'f').replace('6', 'g').replace('7', 'h')
-                          .replace('8', 'i').replace('9', 'j'))
+    print(f"{counts['converted']} converted, {len(targets) - counts['converted'] - counts['failed']} unchanged, "
+          f"{counts['failed']} failed, {counts['removed']} removed")
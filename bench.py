@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import shutil
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+from dmdcore import convert, rgb_array, intensity_plane, threshold_lut, plane_to_image, FORMAT_V2, FORMAT_V3
+from dmdformat import encode_page, decode_page, PageFile
+from dmdpreview import render_led_grid
+from dmdbatch import convert_directory
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(ROOT, "bench_baseline.json")
+RESULTS_VERSION = 1
+
+# every mode load_source and convert() have a distinct path for
+CORPUS_MODES = ("RGB", "RGBA", "LA", "P", "L")
+DEFAULT_COUNT = 200
+DEFAULT_REPEAT = 5
+DEFAULT_REGRESSION = 0.25
+
+PREVIEW_COLOUR = (255, 20, 20)
+PREVIEW_BORDER_COLOUR = (40, 40, 40)
+
+
+def make_corpus(directory, count=DEFAULT_COUNT, seed=0):
+    """
+    Write ``count`` random 32x32 PNG sources per mode, P images carry a transparent index.
+
+    Returns
+    -------
+    dict
+        Mode -> list of paths.
+    """
+    rng = np.random.default_rng(seed)
+    corpus = {}
+    for mode in CORPUS_MODES:
+        corpus[mode] = []
+        for n in range(count):
+            image = Image.fromarray(rng.integers(0, 256, (32, 32, 4), dtype=np.uint8), "RGBA")
+            path = os.path.join(directory, f"{mode}_{n:04d}.png")
+            if mode == "P":
+                image.convert("RGB").quantize(64).save(path, transparency=0)
+            else:
+                image.convert(mode).save(path)
+            corpus[mode].append(path)
+    return corpus
+
+
+def per_item(func, items, repeat=DEFAULT_REPEAT):
+    """
+    Best of ``repeat`` timed passes of ``func`` over ``items``, in seconds per item.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items)
+
+
+def run_benchmarks(corpus, scratch, repeat=DEFAULT_REPEAT, jobs=(1, 4, None)):
+    results = {}
+    output = os.path.join(scratch, "page.dmd")
+
+    for mode, paths in corpus.items():
+        results[f"convert[{mode}]"] = per_item(lambda path: convert(path, output), paths, repeat)
+
+    intensities = []
+    for path in corpus["RGB"]:
+        with Image.open(path) as image:
+            intensities.append(intensity_plane(rgb_array(image)))
+
+    def preview(intensity):
+        plane = threshold_lut(50)[intensity]
+        plane_to_image(plane).tobytes()
+        render_led_grid(plane, PREVIEW_COLOUR, PREVIEW_BORDER_COLOUR).tobytes()
+
+    results["gui_preview"] = per_item(preview, intensities, repeat)
+
+    planes = [threshold_lut(50)[intensity] for intensity in intensities]
+    for version in (FORMAT_V2, FORMAT_V3):
+        pages = [encode_page(plane, 1, version) for plane in planes]
+        results[f"decode[v{version}]"] = per_item(decode_page, pages, repeat)
+
+        paths = []
+        for n, page in enumerate(pages):
+            paths.append(os.path.join(scratch, f"v{version}_{n:04d}.dmd"))
+            with open(paths[-1], "wb") as file:
+                file.write(page)
+
+        def open_page(path):
+            with PageFile(path) as page_file:
+                page_file.plane()
+
+        results[f"pagefile[v{version}]"] = per_item(open_page, paths, repeat)
+
+    batch_in = os.path.dirname(corpus["RGB"][0])
+    batch_out = os.path.join(scratch, "batch")
+    os.makedirs(batch_out, exist_ok=True)
+    files = sum(len(paths) for paths in corpus.values())
+    for workers in dict.fromkeys(jobs):
+        def batch(_):
+            for _ in convert_directory(batch_in, batch_out, workers=workers):
+                pass
+
+        # pool start-up is part of what a batch run pays for
+        results[f"batch[{workers or 'N'}]"] = per_item(batch, [None], repeat) / files
+
+    return results
+
+
+def startup_time(command, repeat=DEFAULT_REPEAT):
+    """
+    Best wall time of ``repeat`` fresh interpreter runs of ``command``, None if it fails.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode:
+            return None
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_startup(corpus, scratch, repeat=DEFAULT_REPEAT):
+    """
+    Cold start of each main.py mode converting one file (single) or one file
+    per image mode on one worker (batch). The GUI can't run headless, so its
+    figure is the import of the GUI module and its Qt dependencies.
+    """
+    main = os.path.join(ROOT, "main.py")
+    batch_in = os.path.join(scratch, "startup_in")
+    os.makedirs(batch_in, exist_ok=True)
+    for paths in corpus.values():
+        shutil.copy(paths[0], batch_in)
+
+    commands = {
+        "python": [sys.executable, "-c", "pass"],
+        "single": [sys.executable, main, "--mode", "single", "--no-cache",
+                   "--input", corpus["RGB"][0], "--output", os.path.join(scratch, "startup.dmd")],
+        "batch": [sys.executable, main, "--mode", "batch", "--no-cache", "--jobs", "1",
+                  "--input", batch_in, "--output", os.path.join(scratch, "startup")],
+        "gui": [sys.executable, "-c", "import gui"],
+    }
+    results = {}
+    for mode, command in commands.items():
+        seconds = startup_time(command, repeat)
+        if seconds is not None:
+            results[f"startup[{mode}]"] = seconds
+    return results
+
+
+def compare(results, baseline, regression=DEFAULT_REGRESSION):
+    """
+    Print each result against the baseline and return the names that are
+    more than ``regression`` (a fraction) slower.
+    """
+    regressions = []
+    print(f"{'benchmark':<18} {'us/item':>10} {'baseline':>10} {'change':>8}")
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base:
+            change = seconds / base - 1
+            flag = "  REGRESSION" if change > regression else ""
+            print(f"{name:<18} {seconds * 1e6:10.1f} {base * 1e6:10.1f} {change:+8.0%}{flag}")
+            if flag:
+                regressions.append(name)
+        else:
+            print(f"{name:<18} {seconds * 1e6:10.1f} {'-':>10} {'-':>8}")
+    return regressions
+
+
+def load_results(path):
+    with open(path) as file:
+        data = json.load(file)
+    if data.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{path} is not a version {RESULTS_VERSION} benchmark file")
+    if (data.get("machine"), data.get("cpus")) != (platform.machine(), os.cpu_count()):
+        print(f"Note: baseline was recorded on {data.get('machine')} with {data.get('cpus')} CPUs")
+    return data["results"]
+
+
+def save_results(path, results, count):
+    with open(path, "w") as file:
+        json.dump({"version": RESULTS_VERSION,
+                   "python": platform.python_version(),
+                   "machine": platform.machine(),
+                   "cpus": os.cpu_count(),
+                   "count": count,
+                   "results": results}, file, indent=1, sort_keys=True)
+        file.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark conversion, preview, decoding and batch throughput')
+    parser.add_argument("--count", default=DEFAULT_COUNT, type=int, help="sources per image mode")
+    parser.add_argument("--repeat", default=DEFAULT_REPEAT, type=int, help="timed passes, the best is kept")
+    parser.add_argument("--output", default=None, type=str, help="write results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE, type=str, help="baseline JSON to compare against")
+    parser.add_argument("--regression", default=DEFAULT_REGRESSION, type=float,
+                        help="fail when a benchmark is this fraction slower than the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir, tempfile.TemporaryDirectory() as scratch:
+        corpus = make_corpus(corpus_dir, args.count)
+        results = run_benchmarks(corpus, scratch, args.repeat)
+        results.update(run_startup(corpus, scratch, args.repeat))
+
+    if args.output:
+        save_results(args.output, results, args.count)
+
+    if args.update_baseline:
+        save_results(args.baseline, results, args.count)
+        print(f"Baseline written to {args.baseline}")
+        compare(results, {})
+    elif os.path.isfile(args.baseline):
+        regressions = compare(results, load_results(args.baseline), args.regression)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        compare(results, {})
@@ -0,0 +1,229 @@
+import os
+import sys
+import struct
+import argparse
+
+import numpy as np
+
+from dmdformat import PAGE_WIDTH, PAGE_HEIGHT, FORMAT_V2, FORMAT_V3, encode_page, check_timemult, parse_timemult
+from dmdpack import page_sources, load_page
+
+ANIM_EXTENSION = ".dmda"
+
+# magic, version, page width, page height, frame count, keyframe interval
+ANIM_MAGIC = b"DMDA"
+ANIM_VERSION = 1
+ANIM_HEADER = struct.Struct("<4sBHHIH")
+
+# frame type, page time multiplier, payload length
+FRAME_HEADER = struct.Struct("<BBH")
+KEYFRAME = 0
+DELTA = 1
+
+DEFAULT_KEYFRAME_INTERVAL = 30
+
+# longest skip or literal run a delta command can hold
+MAX_RUN = 255
+
+
+def rle_delta(previous: np.ndarray, current: np.ndarray) -> bytes:
+    """
+    Run-length encode the XOR of two packed frames.
+
+    The result is a list of (skip, count, count literal XOR bytes) commands:
+    skip unchanged bytes, then XOR the next count bytes.
+    """
+    xor = previous ^ current
+    changed = np.flatnonzero(xor)
+    if not len(changed):
+        return b""
+
+    # split the changed bytes into runs of consecutive offsets
+    breaks = np.flatnonzero(np.diff(changed) != 1) + 1
+    starts = changed[np.r_[0, breaks]]
+    ends = changed[np.r_[breaks - 1, len(changed) - 1]] + 1
+
+    out = bytearray()
+    position = 0
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        skip = start - position
+        while skip > MAX_RUN:
+            out += bytes((MAX_RUN, 0))
+            skip -= MAX_RUN
+        while start < end:
+            count = min(end - start, MAX_RUN)
+            out += bytes((skip, count))
+            out += xor[start:start + count].tobytes()
+            skip = 0
+            start += count
+        position = end
+    return bytes(out)
+
+
+def apply_delta(frame: np.ndarray, delta) -> None:
+    """
+    Apply a ``rle_delta`` payload to a packed frame in place.
+    """
+    position = 0
+    index = 0
+    while index < len(delta):
+        skip, count = delta[index], delta[index + 1]
+        position += skip
+        index += 2
+        frame[position:position + count] ^= np.frombuffer(delta, dtype=np.uint8, count=count, offset=index)
+        position += count
+        index += count
+
+
+class AnimationEncoder:
+    """
+    Encodes pages into keyframes and run-length encoded XOR deltas.
+
+    A keyframe is written every ``keyframe_interval`` frames, and whenever a
+    delta would be no smaller than the keyframe itself.
+    """
+
+    def __init__(self, file, width=PAGE_WIDTH, height=PAGE_HEIGHT, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        # the header and frame fields are 16 bit
+        if not 1 <= keyframe_interval <= 0xFFFF:
+            raise ValueError(f"Keyframe interval must be 1~65535, Got {keyframe_interval}")
+        if (width * height + 7) // 8 > 0xFFFF:
+            raise ValueError(f"Animation pages are at most 65535 bytes, {width}x{height} is too large")
+        self.file = file
+        self.width = width
+        self.height = height
+        self.keyframe_interval = keyframe_interval
+        self.previous = None
+        self.since_keyframe = 0
+        self.count = 0
+        self.keyframes = 0
+        self.start = file.tell()
+        file.write(bytes(ANIM_HEADER.size))
+
+    def add(self, plane: np.ndarray, timemult=1):
+        if plane.dtype != np.bool_:
+            raise ValueError("Animations hold 1 bit pages, multi-level pages can't be animated")
+        if plane.shape != (self.height, self.width):
+            raise ValueError(f"Page is {plane.shape[1]}x{plane.shape[0]}, animation is {self.width}x{self.height}")
+        check_timemult(timemult)
+        packed = np.packbits(plane)
+
+        frame_type, payload = KEYFRAME, packed.tobytes()
+        if self.previous is not None and self.since_keyframe < self.keyframe_interval:
+            delta = rle_delta(self.previous, packed)
+            if len(delta) < len(payload):
+                frame_type, payload = DELTA, delta
+
+        if frame_type == KEYFRAME:
+            self.keyframes += 1
+            self.since_keyframe = 0
+        self.since_keyframe += 1
+
+        self.file.write(FRAME_HEADER.pack(frame_type, timemult, len(payload)))
+        self.file.write(payload)
+        self.previous = packed
+        self.count += 1
+
+    def close(self):
+        end = self.file.tell()
+        self.file.seek(self.start)
+        self.file.write(ANIM_HEADER.pack(ANIM_MAGIC, ANIM_VERSION, self.width, self.height, self.count,
+                                         self.keyframe_interval))
+        self.file.seek(end)
+
+
+def decode_animation(data):
+    """
+    Decode an animation, yielding (on/off plane, time multiplier) per frame.
+    """
+    if len(data) < ANIM_HEADER.size:
+        raise ValueError("Animation is corrupt\nFile is shorter than the header")
+    magic, version, width, height, count, _ = ANIM_HEADER.unpack_from(data)
+    if magic != ANIM_MAGIC or version != ANIM_VERSION:
+        raise ValueError(f"Not a DMD animation (version {ANIM_VERSION})")
+
+    pixels = width * height
+    frame = None
+    offset = ANIM_HEADER.size
+    for _ in range(count):
+        frame_type, timemult, length = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+        payload = data[offset:offset + length]
+        offset += length
+        if len(payload) != length:
+            raise ValueError("Animation is corrupt\nFrame runs past the end of the file")
+
+        if frame_type == KEYFRAME:
+            frame = np.frombuffer(payload, dtype=np.uint8).copy()
+        elif frame_type == DELTA and frame is not None:
+            apply_delta(frame, payload)
+        else:
+            raise ValueError(f"Animation is corrupt\nUnexpected frame type {frame_type}")
+
+        yield np.unpackbits(frame, count=pixels).reshape(height, width) != 0, timemult
+
+
+def encode_animation(path, sources, threshold=50, invert=False, timemult=None,
+                     keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+    """
+    Encode page files (.dmd pages or rasters, see ``dmdpack.load_page``) to an animation.
+
+    Returns
+    -------
+    tuple
+        (encoder, encoded size in bytes), the encoder holds the frame and keyframe counts.
+    """
+    with open(path, "wb") as file:
+        try:
+            encoder = AnimationEncoder(file, keyframe_interval=keyframe_interval)
+            for source in sources:
+                encoder.add(*load_page(source, threshold, invert, timemult))
+        except BaseException:
+            # don't leave an animation with no header behind
+            file.close()
+            os.remove(path)
+            raise
+        encoder.close()
+        return encoder, file.tell()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Encode and decode delta compressed DMD animations')
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    encode_parser = subparsers.add_parser("encode", help="encode a directory of .dmd pages and raster images")
+    encode_parser.add_argument("dir_in", help="page directory, frames are taken in file name order")
+    encode_parser.add_argument("animation", help="output animation")
+    encode_parser.add_argument("--keyframe-interval", default=DEFAULT_KEYFRAME_INTERVAL, type=int,
+                               help="frames between keyframes")
+    encode_parser.add_argument("--threshold", default=50, type=int, help="on/off threshold for rasters (0~255)")
+    encode_parser.add_argument("--invert", default=False, type=bool, help="invert on/off pixels of rasters")
+    encode_parser.add_argument("--timemult", default=None, type=parse_timemult,
+                               help="page time multiplier for every frame (default: stored value, or 1)")
+
+    decode_parser = subparsers.add_parser("decode", help="write every frame of an animation as a .dmd page")
+    decode_parser.add_argument("animation")
+    decode_parser.add_argument("dir_out")
+    decode_parser.add_argument("--legacy", action="store_true", help="write DMD v2 pages for older loaders")
+
+    args = parser.parse_args()
+
+    if args.action == "encode":
+        try:
+            encoder, size = encode_animation(args.animation, page_sources(args.dir_in), args.threshold, args.invert,
+                                             args.timemult, args.keyframe_interval)
+        except (OSError, ValueError) as e:
+            print(f"Failed to encode {args.dir_in}: {e}", file=sys.stderr)
+            sys.exit(1)
+        raw = encoder.count * (PAGE_WIDTH * PAGE_HEIGHT + 1)
+        print(f"Encoded {encoder.count} frames ({encoder.keyframes} keyframes) into {size} bytes, "
+              f"{raw / size if size else 0:.1f}:1 against {raw} bytes of DMD v2 pages")
+    elif args.action == "decode":
+        os.makedirs(args.dir_out, exist_ok=True)
+        with open(args.animation, "rb") as file:
+            data = file.read()
+        count = 0
+        for count, (plane, timemult) in enumerate(decode_animation(data), 1):
+            with open(os.path.join(args.dir_out, f"{count - 1:04d}.dmd"), "wb") as file:
+                file.write(encode_page(plane, timemult, FORMAT_V2 if args.legacy else FORMAT_V3))
+        print(f"Decoded {count} frames to {args.dir_out}")
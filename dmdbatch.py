@@ -0,0 +1,263 @@
+import os
+import json
+import hashlib
+import multiprocessing
+
+from PIL import Image
+
+from dmdcore import convert, ALGORITHM_VERSION, FORMAT_V3, PAGE_SIZE
+from dmdcache import PageCache
+import dmdprofile
+
+RASTER_EXTENSIONS = (".png", ".jpg", ".bmp", ".dib", ".jpeg", ".jpe", ".jfif", ".tiff", ".tif", ".webp")
+
+MAX_CHUNKSIZE = 256
+
+MANIFEST_NAME = ".dmd-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def find_sources(directory, extensions=RASTER_EXTENSIONS):
+    return sorted(entry.path for entry in os.scandir(directory)
+                  if entry.is_file() and entry.name.lower().endswith(extensions))
+
+
+def output_path(source, dir_out):
+    return os.path.join(dir_out, os.path.splitext(os.path.basename(source))[0] + ".dmd")
+
+
+# --alpha page names, for loaders that sort or match letters rather than digits
+ALPHA_TABLE = str.maketrans("0123456789", "abcdefghij")
+
+
+def alpha_name(name):
+    """
+    Map the digits 0~9 of a page name to a~j, 0001.dmd -> aaab.dmd.
+    """
+    return name.translate(ALPHA_TABLE)
+
+
+def file_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+_worker_caches = {}
+
+
+def worker_cache(cache_dir):
+    """
+    One PageCache per process and directory, so pool workers reuse their connection.
+    """
+    if cache_dir is None:
+        return None
+    if cache_dir not in _worker_caches:
+        _worker_caches[cache_dir] = PageCache(cache_dir)
+    return _worker_caches[cache_dir]
+
+
+def convert_job(job):
+    """
+    Convert one (input, output, threshold, invert, timemult, cache_dir, version, size, policy, dither, depth) job.
+
+    Returns (input, output, error) so a bad file, including a decompression
+    bomb Pillow refuses to open, doesn't stop the batch.
+    """
+    in_file, output, threshold, invert, timemult, cache_dir, version, size, policy, dither, depth = job
+    try:
+        convert(in_file, output, threshold, invert, timemult, worker_cache(cache_dir), version, size, policy, dither,
+                depth)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return in_file, output, str(e)
+    return in_file, output, None
+
+
+def profiled_job(job):
+    """
+    ``convert_job`` that also hands the worker's stage timings back to the parent.
+    """
+    return convert_job(job), dmdprofile.drain()
+
+
+def convert_many(jobs, workers=None, chunksize=None):
+    """
+    Run convert jobs across a process pool, yielding results as each chunk completes.
+
+    Parameters
+    ----------
+    jobs : list of (input, output, threshold, invert, timemult, cache_dir, version, size, policy, dither, depth)
+    workers : int, optional
+        Number of worker processes, defaults to the CPU count. 1 converts in-process.
+    chunksize : int, optional
+        Jobs handed to a worker at a time, defaults to about four chunks per worker.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        yield from map(convert_job, jobs)
+        return
+
+    workers = min(workers, len(jobs))
+    if chunksize is None:
+        chunksize = max(1, min(MAX_CHUNKSIZE, len(jobs) // (workers * 4)))
+
+    with multiprocessing.Pool(workers, initializer=dmdprofile.reset) as pool:
+        if not dmdprofile.enabled:
+            yield from pool.imap_unordered(convert_job, jobs, chunksize)
+        else:
+            for result, samples in pool.imap_unordered(profiled_job, jobs, chunksize):
+                dmdprofile.merge(samples)
+                yield result
+        # workers left to exit on their own write out their cache entries, terminating them would drop them
+        pool.close()
+        pool.join()
+
+
+def convert_directory(dir_in, dir_out, threshold=50, invert=False, workers=None,
+                      extensions=RASTER_EXTENSIONS, chunksize=None, timemult=1, cache_dir=None, version=FORMAT_V3,
+                      size=PAGE_SIZE, policy="fit", dither="none", depth=1):
+    jobs = [(source, output_path(source, dir_out), threshold, invert, timemult, cache_dir, version, size, policy,
+             dither, depth)
+            for source in find_sources(dir_in, extensions)]
+    yield from convert_many(jobs, workers, chunksize)
+
+
+def load_manifest(dir_out):
+    try:
+        with open(os.path.join(dir_out, MANIFEST_NAME)) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("entries", {})
+
+
+def save_manifest(dir_out, entries):
+    path = os.path.join(dir_out, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as file:
+        json.dump({"version": MANIFEST_VERSION, "entries": entries}, file, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def plan_rebuild(targets, dir_out, entries, params, scope=None):
+    """
+    Work out which targets need converting.
+
+    Sources whose size and mtime match the manifest are trusted without
+    re-hashing; otherwise the content hash decides, so a touched but
+    unchanged file is not reconverted.
+
+    Parameters
+    ----------
+    targets : dict
+        Source name -> (source path, output name).
+    dir_out : str
+    entries : dict
+        Manifest entries from the previous build.
+    params : dict
+        Conversion parameters (threshold, invert, timemult, ...).
+    scope : callable, optional
+        Predicate on source names. Entries outside the scope belong to another
+        build sharing the output directory and are kept as they are.
+
+    Returns
+    -------
+    tuple
+        (stale source names, new manifest entries for the up to date sources,
+        orphaned output names)
+    """
+    owned = {name for name in entries if name in targets or scope is None or scope(name)}
+
+    fresh = {name: entry for name, entry in entries.items() if name not in owned}
+    stale = []
+    for name, (source, output) in targets.items():
+        stat = os.stat(source)
+        entry = entries.get(name)
+        if (not entry or entry["output"] != output or entry["params"] != params
+                or not os.path.isfile(os.path.join(dir_out, output))):
+            stale.append(name)
+            continue
+
+        if (entry["source_size"], entry["source_mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            if file_digest(source) != entry["source_hash"]:
+                stale.append(name)
+                continue
+            entry = dict(entry, source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+        fresh[name] = entry
+
+    live_outputs = {output for _, output in targets.values()} | {entry["output"] for entry in fresh.values()}
+    orphans = sorted({entries[name]["output"] for name in owned if entries[name]["output"] not in live_outputs})
+    return stale, fresh, orphans
+
+
+def build_directory(targets, dir_out, threshold=50, invert=False, timemult=1, workers=None, force=False,
+                    scope=None, cache_dir=None, version=FORMAT_V3, size=PAGE_SIZE, policy="fit", dither="none",
+                    depth=1):
+    """
+    Incrementally convert ``targets`` into ``dir_out``, tracking state in a manifest.
+
+    Only new or changed sources (by content hash or conversion parameters) are
+    converted, and outputs whose source has gone are removed.
+
+    Parameters
+    ----------
+    targets : dict
+        Source name -> (source path, output name).
+    force : bool
+        Ignore the manifest and convert everything.
+    scope : callable, optional
+        Predicate on source names this build is responsible for, see ``plan_rebuild``.
+    cache_dir : str, optional
+        PageCache directory shared by the workers, None disables the cache.
+    version : int
+        DMD page format version to write.
+    size : tuple
+        Page (width, height), sources of another size are resized with ``policy``.
+    policy : str
+        One of ``dmdcore.RESIZE_POLICIES``.
+    dither : str
+        One of ``dmddither.DITHER_MODES``.
+    depth : int
+        Bits per pixel, over 1 writes multi-level pages.
+
+    Yields
+    ------
+    tuple
+        (action, name, error) with action one of "converted", "failed" or "removed".
+    """
+    params = {"threshold": threshold, "invert": invert, "timemult": timemult, "version": ALGORITHM_VERSION,
+              "format": version, "size": list(size), "policy": policy, "dither": dither,
+              "depth": depth}
+    entries = load_manifest(dir_out)
+    if force:
+        entries = {name: entry for name, entry in entries.items() if name not in targets}
+    stale, fresh, orphans = plan_rebuild(targets, dir_out, entries, params, scope)
+
+    for output in orphans:
+        try:
+            os.remove(os.path.join(dir_out, output))
+        except FileNotFoundError:
+            pass
+        yield "removed", output, None
+
+    names = {targets[name][0]: name for name in stale}
+    jobs = [(targets[name][0], os.path.join(dir_out, targets[name][1]), threshold, invert, timemult, cache_dir,
+             version, size, policy, dither, depth) for name in stale]
+    try:
+        for in_file, output, error in convert_many(jobs, workers):
+            name = names[in_file]
+            if error:
+                yield "failed", name, error
+                continue
+
+            stat = os.stat(in_file)
+            fresh[name] = {"output": targets[name][1],
+                           "params": params,
+                           "source_hash": file_digest(in_file),
+                           "source_size": stat.st_size,
+                           "source_mtime_ns": stat.st_mtime_ns,
+                           "output_hash": file_digest(output)}
+            yield "converted", name, None
+    finally:
+        save_manifest(dir_out, fresh)
@@ -0,0 +1,122 @@
+import os
+import time
+import sqlite3
+import hashlib
+
+# payloads are a byte per pixel at any depth, so ~64 MiB of 32x32 pages and more for larger --size pages
+DEFAULT_MAX_ENTRIES = 65536
+EVICT_INTERVAL = 256
+# new entries are written together, one transaction per this many
+FLUSH_INTERVAL = 64
+# a hit only rewrites the access time once it is this many seconds old, eviction doesn't need it any finer
+ATIME_INTERVAL = 3600
+
+
+def default_cache_dir():
+    if os.environ.get("DMD_CACHE_DIR"):
+        return os.environ["DMD_CACHE_DIR"]
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        return os.path.join(os.environ["LOCALAPPDATA"], "DMD_PageBuilder", "cache")
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "dmd_pagebuilder")
+
+
+def source_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PageCache:
+    """
+    On-disk cache of converted page payloads (the pixel bytes, without the
+    time multiplier header), keyed by source digest and conversion parameters.
+
+    Least recently used entries are evicted once ``max_entries`` is exceeded.
+    Any database error is treated as a miss so a broken cache never stops a
+    conversion.
+
+    Writes are kept cheap enough that a cold cache costs little over no cache:
+    new entries are held in memory and written ``FLUSH_INTERVAL`` at a time
+    (and when the cache is closed or its process exits), and hits refresh
+    their access time at most every ``ATIME_INTERVAL`` seconds.
+    """
+
+    def __init__(self, directory=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory or default_cache_dir()
+        self.max_entries = max_entries
+        self._db = None
+        self._puts = 0
+        self._pending = {}
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # the service converts on its dispatch thread and the last flush runs at exit on the main one
+            self._db = sqlite3.connect(os.path.join(self.directory, "pages.sqlite3"), timeout=10,
+                                       check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # with WAL, commits no longer wait for an fsync, a crash can only lose the last few entries
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS pages "
+                             "(key TEXT PRIMARY KEY, data BLOB NOT NULL, atime REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_atime ON pages (atime)")
+            # pool workers exit without atexit handlers, multiprocessing's exit hook runs in both
+            from multiprocessing.util import Finalize
+            Finalize(self, self.close, exitpriority=10)
+        return self._db
+
+    @staticmethod
+    def key(digest, *params):
+        return hashlib.sha256(repr((digest,) + params).encode()).hexdigest()
+
+    def get(self, key):
+        if key in self._pending:
+            return self._pending[key]
+        try:
+            db = self._connect()
+            row = db.execute("SELECT data, atime FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > ATIME_INTERVAL:
+                with db:
+                    db.execute("UPDATE pages SET atime = ? WHERE key = ?", (now, key))
+        except (sqlite3.Error, OSError):
+            return None
+        return bytes(row[0])
+
+    def put(self, key, data: bytes):
+        self._pending[key] = data
+        if len(self._pending) >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending entries in one transaction.
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            db = self._connect()
+            now = time.time()
+            with db:
+                db.executemany("INSERT OR REPLACE INTO pages (key, data, atime) VALUES (?, ?, ?)",
+                               ((key, data, now) for key, data in pending.items()))
+            if self._puts == 0 or self._puts // EVICT_INTERVAL != (self._puts + len(pending)) // EVICT_INTERVAL:
+                self.evict()
+            self._puts += len(pending)
+        except (sqlite3.Error, OSError):
+            pass
+
+    def evict(self):
+        db = self._connect()
+        count = db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        if count > self.max_entries:
+            with db:
+                db.execute("DELETE FROM pages WHERE key IN "
+                           "(SELECT key FROM pages ORDER BY atime LIMIT ?)", (count - self.max_entries,))
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,301 @@
+import io
+import os
+import functools
+
+import numpy as np
+from PIL import Image
+
+from dmdcache import source_digest
+from dmdprofile import stage
+from dmddither import DITHER_MODES, dither_plane
+# page format names are re-exported here for the entry points
+from dmdformat import (PAGE_WIDTH, PAGE_HEIGHT, PAGE_PIXELS, FORMAT_V2, FORMAT_V3, MAX_DEPTH, encode_page,
+                       decode_page, plane_bytes, plane_from_bytes, check_depth, parse_timemult)
+
+# Bump whenever conversion output changes, it is part of every cache key
+ALGORITHM_VERSION = 1
+
+PAGE_SIZE = (PAGE_WIDTH, PAGE_HEIGHT)
+
+# fit: scale to fit inside the page and pad with black
+# fill: scale to cover the page and crop the overflow
+# crop: keep the original scale, take the centre and pad if smaller
+RESIZE_POLICIES = ("fit", "fill", "crop")
+
+# Image.reduce stops at this multiple of the final size, the resample does the rest
+REDUCING_GAP = 2
+
+# modes that resize and flatten without a palette or conversion
+RESAMPLE_MODES = ("RGB", "RGBA", "L", "LA")
+
+
+def remove_transparency(im, bg_colour=(255, 255, 255)):
+    # Only process if image has transparency (http://stackoverflow.com/a/1963146)
+    if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
+
+        # Need to convert to RGBA if LA format due to a bug in PIL (http://stackoverflow.com/a/1963146)
+        alpha = im.convert('RGBA').split()[-1]
+
+        # Create a new background image of our matt color.
+        # Must be RGBA because paste requires both images to have the same format
+        # (http://stackoverflow.com/a/8720632  and  http://stackoverflow.com/a/9459208)
+        bg = Image.new("RGBA", im.size, bg_colour + (255,))
+        bg.paste(im, mask=alpha)
+        return bg
+
+    else:
+        return im
+
+
+def has_transparency(im) -> bool:
+    return im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
+
+
+def rgb_array(im, bg_colour=(0, 0, 0)) -> np.ndarray:
+    """
+    Return the image as a (height, width, 3) uint8 array with any alpha
+    flattened onto ``bg_colour``.
+
+    The blend uses the same rounding as ``Image.paste`` with a mask, so the
+    result matches ``remove_transparency(im, bg_colour).convert("RGB")``.
+    """
+    if not has_transparency(im):
+        return np.asarray(im.convert("RGB"))
+
+    rgba = np.asarray(im.convert("RGBA"), dtype=np.uint32)
+    alpha = rgba[..., 3:]
+    blend = rgba[..., :3] * alpha + np.asarray(bg_colour, dtype=np.uint32) * (255 - alpha) + 128
+    return (((blend >> 8) + blend) >> 8).astype(np.uint8)
+
+
+def intensity_plane(rgb: np.ndarray) -> np.ndarray:
+    """
+    Sum of the three channels per pixel (0~765).
+
+    Thresholding against ``3 * threshold`` is exactly the old
+    ``statistics.mean(pixel) > threshold`` test, without fractions.
+    """
+    return rgb.sum(axis=2, dtype=np.int32)
+
+
+def plane_intensity(plane: np.ndarray, depth=1) -> np.ndarray:
+    """
+    Intensity plane of an on/off plane, as if it were decoded from a black and
+    white image, or of a level plane, as if decoded from its grey levels.
+    """
+    if depth == 1:
+        return np.where(plane, 765, 0).astype(np.int32)
+    return plane.astype(np.int32) * 765 // (2 ** depth - 1)
+
+
+def threshold_plane(intensity: np.ndarray, threshold=50, invert=False) -> np.ndarray:
+    """
+    Binarize an intensity plane into a boolean on/off plane.
+
+    ``invert`` inverts the source colours before thresholding, as
+    ``ImageOps.invert`` did.
+    """
+    if invert:
+        intensity = 765 - intensity
+    return intensity > 3 * threshold
+
+
+def binarize(intensity: np.ndarray, threshold=50, invert=False, dither="none") -> np.ndarray:
+    """
+    Binarize an intensity plane with a plain threshold (``dither="none"``) or
+    one of the ``dmddither.DITHER_MODES``.
+    """
+    if dither == "none":
+        return threshold_plane(intensity, threshold, invert)
+    return dither_plane(intensity, threshold, invert, dither)
+
+
+def level_plane(intensity: np.ndarray, threshold=50, invert=False, depth=1) -> np.ndarray:
+    """
+    Quantize an intensity plane to a level plane of ``2**depth`` levels.
+
+    Intensities up to the threshold are level 0 and the rest spread evenly
+    over the other levels, so a depth of 1 gives ``threshold_plane`` exactly.
+    """
+    if invert:
+        intensity = 765 - intensity
+    top = 2 ** depth - 1
+    span = 765 - 3 * threshold
+    if span <= 0:
+        return np.zeros(intensity.shape, dtype=np.uint8)
+    return np.clip(((intensity - 3 * threshold) * top + span - 1) // span, 0, top).astype(np.uint8)
+
+
+def page_plane(intensity: np.ndarray, threshold=50, invert=False, dither="none", depth=1) -> np.ndarray:
+    """
+    The plane a page stores: on/off from ``binarize``, or levels for a ``depth`` over 1.
+    """
+    if depth == 1:
+        return binarize(intensity, threshold, invert, dither)
+    check_depth(depth)
+    if dither != "none":
+        raise ValueError("Dithering makes 1 bit pages, multi-level pages can't be dithered")
+    return level_lut(threshold, invert, depth).take(intensity)
+
+
+def threshold_lut(threshold=50, invert=False) -> np.ndarray:
+    """
+    Lookup table from every intensity plane value to on/off, so
+    ``threshold_lut(t, i)[intensity]`` equals ``threshold_plane(intensity, t, i)``.
+
+    The plane holds channel sums rather than means, so the table has 766
+    entries instead of 256 and keeps the exact comparison.
+    """
+    return threshold_plane(np.arange(766, dtype=np.int32), threshold, invert)
+
+
+@functools.lru_cache(maxsize=64)
+def level_lut(threshold=50, invert=False, depth=1) -> np.ndarray:
+    """
+    ``threshold_lut`` for ``level_plane``, cached and read-only.
+    """
+    lut = level_plane(np.arange(766, dtype=np.int32), threshold, invert, depth)
+    lut.flags.writeable = False
+    return lut
+
+
+def parse_size(text):
+    """
+    Parse a ``WIDTHxHEIGHT`` page size, for argparse.
+    """
+    try:
+        width, height = (int(value) for value in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Page size must be WIDTHxHEIGHT, Got {text}")
+    if width < 1 or height < 1:
+        raise ValueError(f"Page size must be at least 1x1, Got {text}")
+    return width, height
+
+
+def scaled_size(size, target, policy="fit"):
+    """
+    Size of an image of ``size`` after scaling for ``policy``, before padding or cropping to ``target``.
+    """
+    width, height = size
+    if policy == "crop":
+        return size
+    scale = (min if policy == "fit" else max)(target[0] / width, target[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def resize_image(image, size=PAGE_SIZE, policy="fit"):
+    """
+    Resize an image of any size to ``size`` with a ``RESIZE_POLICIES`` policy.
+
+    An image that is already the right size is returned untouched. Otherwise
+    JPEGs are decoded at a reduced scale (draft mode) when the image hasn't
+    been loaded yet, and any image is shrunk by an integer factor with
+    ``Image.reduce`` before the final Lanczos resample, so a large photo is
+    never fully decoded or resampled just to produce a page.
+    """
+    if policy not in RESIZE_POLICIES:
+        raise ValueError(f"Unknown resize policy {policy}, expected one of {', '.join(RESIZE_POLICIES)}")
+    size = tuple(size)
+    if image.size == size:
+        return image
+
+    scaled = scaled_size(image.size, size, policy)
+    with stage("decode"):
+        if policy != "crop":
+            image.draft(None, scaled)
+        image.load()
+
+    with stage("resize"):
+        if image.mode not in RESAMPLE_MODES:
+            image = image.convert("RGBA" if has_transparency(image) else "RGB")
+        if image.size != scaled:
+            factor = min(image.width // (scaled[0] * REDUCING_GAP), image.height // (scaled[1] * REDUCING_GAP))
+            if factor > 1:
+                image = image.reduce(factor)
+            image = image.resize(scaled, Image.LANCZOS)
+
+        # black, or transparent for modes with alpha, both flatten to off
+        page = Image.new(image.mode, size)
+        page.paste(image, ((size[0] - image.width) // 2, (size[1] - image.height) // 2))
+        return page
+
+
+def plane_to_image(plane: np.ndarray, depth=1):
+    """
+    Return an RGB image with on pixels white and off pixels black, levels in between.
+    """
+    if depth == 1:
+        return Image.fromarray(plane.astype(np.uint8) * 255, "L").convert("RGB")
+    return Image.fromarray((plane.astype(np.uint16) * 255 // (2 ** depth - 1)).astype(np.uint8), "L").convert("RGB")
+
+
+def convert_plane(image, threshold=50, invert=False, size=PAGE_SIZE, policy="fit", dither="none",
+                  depth=1) -> np.ndarray:
+    image = resize_image(image, size, policy)
+    with stage("decode"):
+        image.load()
+    with stage("transparency"):
+        rgb = rgb_array(image)
+    with stage("threshold"):
+        return page_plane(intensity_plane(rgb), threshold, invert, dither, depth)
+
+
+def convert_image(image, threshold=50, invert=False, timemult=1, version=FORMAT_V3, size=PAGE_SIZE,
+                  policy="fit", dither="none", depth=1) -> bytes:
+    plane = convert_plane(image, threshold, invert, size, policy, dither, depth)
+    with stage("encode"):
+        return encode_page(plane, timemult, version, depth)
+
+
+def source_plane(source: bytes, threshold=50, invert=False, cache=None, size=PAGE_SIZE, policy="fit",
+                 dither="none", depth=1) -> np.ndarray:
+    """
+    On/off plane of an encoded raster image, consulting ``cache`` (a
+    ``dmdcache.PageCache``) before decoding.
+    """
+    if cache is None:
+        with Image.open(io.BytesIO(source)) as image:
+            return convert_plane(image, threshold, invert, size, policy, dither, depth)
+
+    with stage("cache"):
+        key = cache.key(source_digest(source), threshold, invert, tuple(size), policy, dither, depth,
+                        ALGORITHM_VERSION)
+        payload = cache.get(key)
+    if payload is not None:
+        return plane_from_bytes(payload, *size, depth)
+
+    with Image.open(io.BytesIO(source)) as image:
+        plane = convert_plane(image, threshold, invert, size, policy, dither, depth)
+    with stage("cache"):
+        cache.put(key, plane_bytes(plane))
+    return plane
+
+
+def convert_bytes(source: bytes, threshold=50, invert=False, timemult=1, cache=None, version=FORMAT_V3,
+                  size=PAGE_SIZE, policy="fit", dither="none", depth=1) -> bytes:
+    """
+    Convert an encoded raster image to a DMD page, consulting ``cache`` (a
+    ``dmdcache.PageCache``) before decoding.
+    """
+    plane = source_plane(source, threshold, invert, cache, size, policy, dither, depth)
+    with stage("encode"):
+        return encode_page(plane, timemult, version, depth)
+
+
+def convert(in_file, output, threshold=50, invert=False, timemult=1, cache=None, version=FORMAT_V3, size=PAGE_SIZE,
+            policy="fit", dither="none", depth=1):
+    if cache is None:
+        with Image.open(in_file) as image:
+            data = convert_image(image, threshold, invert, timemult, version, size, policy, dither, depth)
+    else:
+        with stage("read"):
+            with open(in_file, "rb") as file:
+                source = file.read()
+        data = convert_bytes(source, threshold, invert, timemult, cache, version, size, policy, dither, depth)
+
+    with stage("write"):
+        # written aside and renamed over the output, so readers never see a partial page
+        with open(output + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(output + ".tmp", output)
+    return data
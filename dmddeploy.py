@@ -0,0 +1,149 @@
+import os
+import time
+import hashlib
+
+from dmdcore import convert_bytes, FORMAT_V3
+from dmdbatch import RASTER_EXTENSIONS, alpha_name
+from dmdpack import page_sources
+
+PAGE_EXTENSION = ".dmd"
+TEMP_SUFFIX = ".tmp"
+
+
+def deploy_names(sources, alpha=False) -> dict:
+    """
+    Final card name -> source path, worked out before anything is written.
+
+    Raises
+    ------
+    ValueError
+        When sources would land on the same card name, such as 0001.png and
+        0001.dmd, or two names ``alpha`` maps to the same letters.
+    """
+    claims = {}
+    for source in sources:
+        name = os.path.splitext(os.path.basename(source))[0] + PAGE_EXTENSION
+        claims.setdefault(alpha_name(name) if alpha else name, []).append(source)
+
+    clashes = [f"{name}: {', '.join(claimed)}" for name, claimed in claims.items() if len(claimed) > 1]
+    if clashes:
+        raise ValueError("Sources share a card name\n" + "\n".join(clashes))
+    return {name: claimed[0] for name, claimed in claims.items()}
+
+
+def page_data(source, cache=None, **options) -> bytes:
+    """
+    Bytes of the page for ``source``, a .dmd page as it is or a raster image converted with ``options``.
+    """
+    with open(source, "rb") as file:
+        data = file.read()
+    if source.lower().endswith(RASTER_EXTENSIONS):
+        return convert_bytes(data, cache=cache, **options)
+    return data
+
+
+def card_pages(card_dir) -> dict:
+    """
+    Page name -> size of the pages already on the card, from one directory listing.
+    """
+    with os.scandir(card_dir) as entries:
+        return {entry.name: entry.stat().st_size for entry in entries
+                if entry.is_file() and entry.name.lower().endswith((PAGE_EXTENSION, PAGE_EXTENSION + TEMP_SUFFIX))}
+
+
+def same_content(path, data) -> bool:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).digest() == hashlib.sha256(data).digest()
+
+
+def plan_deploy(pages, card_dir, existing):
+    """
+    Work out what to write to the card.
+
+    A page is unchanged when the card holds a file of the same size and
+    hash, so only same size candidates are read back from the card.
+
+    Parameters
+    ----------
+    pages : dict
+        Card name -> page bytes.
+    existing : dict
+        Card name -> size, see ``card_pages``.
+
+    Returns
+    -------
+    tuple
+        (names to write, stale card names)
+    """
+    changed = [name for name, data in pages.items()
+               if existing.get(name) != len(data) or not same_content(os.path.join(card_dir, name), data)]
+    stale = sorted(name for name in existing if name not in pages)
+    return changed, stale
+
+
+# without os.sync (Windows) each written page is flushed to the card as it is written instead
+SYNC_ONCE = hasattr(os, "sync")
+
+
+def deploy(sources, card_dir, alpha=False, delete=False, cache=None, threshold=50, invert=False, timemult=1,
+           version=FORMAT_V3, **options):
+    """
+    Bring a card's pages up to date with ``sources``, writing as little as possible.
+
+    Changed pages are written next to their final name and renamed over it,
+    so a card pulled mid-deploy never holds a truncated page, and the card
+    is synced once at the end rather than after every file. Temp files left
+    by an interrupted deploy are cleaned up.
+
+    Parameters
+    ----------
+    sources : list of str
+        .dmd pages and raster images, rasters are converted on the way.
+    alpha : bool
+        Map the digits of page names to letters, see ``dmdbatch.alpha_name``.
+    delete : bool
+        Remove pages on the card that aren't in ``sources``.
+
+    Returns
+    -------
+    dict
+        Counts of written, unchanged and removed pages, bytes written and seconds taken.
+    """
+    start = time.perf_counter()
+    names = deploy_names(sources, alpha)
+    pages = {name: page_data(source, cache, threshold=threshold, invert=invert, timemult=timemult,
+                             version=version, **options)
+             for name, source in names.items()}
+
+    existing = card_pages(card_dir)
+    leftovers = [name for name in existing if name.endswith(TEMP_SUFFIX)]
+    for name in leftovers:
+        del existing[name]
+    changed, stale = plan_deploy(pages, card_dir, existing)
+
+    written = 0
+    for name in changed:
+        with open(os.path.join(card_dir, name + TEMP_SUFFIX), "wb") as file:
+            file.write(pages[name])
+            if not SYNC_ONCE:
+                os.fsync(file.fileno())
+        written += len(pages[name])
+    for name in changed:
+        os.replace(os.path.join(card_dir, name + TEMP_SUFFIX), os.path.join(card_dir, name))
+
+    removed = stale if delete else []
+    overwritten = set(changed)
+    for name in removed + [name for name in leftovers if name[:-len(TEMP_SUFFIX)] not in overwritten]:
+        os.remove(os.path.join(card_dir, name))
+
+    if SYNC_ONCE and (changed or removed or leftovers):
+        os.sync()
+    return {"written": len(changed), "unchanged": len(pages) - len(changed), "removed": len(removed),
+            "bytes": written, "seconds": time.perf_counter() - start}
+
+
+def deploy_directory(dir_in, card_dir, **options):
+    """
+    ``deploy`` every page and raster image of ``dir_in``.
+    """
+    return deploy(page_sources(dir_in), card_dir, **options)
@@ -0,0 +1,100 @@
+from functools import lru_cache
+
+import numpy as np
+
+DITHER_MODES = ("none", "bayer", "floyd-steinberg", "atkinson")
+
+BAYER_ORDER = 8
+
+# (dx, dy, weight) of the error handed to each later neighbour, and the weight divisor.
+# Atkinson only passes on 6/8 of the error, which keeps highlights and shadows clean.
+DIFFUSION_KERNELS = {
+    "floyd-steinberg": (((1, 0, 7), (-1, 1, 3), (0, 1, 5), (1, 1, 1)), 16),
+    "atkinson": (((1, 0, 1), (2, 0, 1), (-1, 1, 1), (0, 1, 1), (1, 1, 1), (0, 2, 1)), 8),
+}
+
+# columns of padding either side and rows below, so the kernels never index out of the buffer
+PAD = 2
+
+
+def dither_levels(intensity: np.ndarray, threshold=50, invert=False) -> np.ndarray:
+    """
+    Grey levels (0~255, float) to dither from an intensity plane.
+
+    The threshold acts as a brightness control: a pixel as bright as the
+    threshold lands on mid grey and comes out half on, so the slider moves
+    dithered output the same way it moves a plain threshold.
+    """
+    if invert:
+        intensity = 765 - intensity
+    return np.clip(intensity / 3 - threshold + 127.5, 0, 255)
+
+
+def bayer_matrix(order=BAYER_ORDER) -> np.ndarray:
+    """
+    ``order`` x ``order`` Bayer index matrix (0 ~ order² - 1), order a power of two.
+    """
+    matrix = np.zeros((1, 1), dtype=np.int32)
+    while len(matrix) < order:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+@lru_cache(maxsize=16)
+def bayer_thresholds(height, width, order=BAYER_ORDER) -> np.ndarray:
+    matrix = (bayer_matrix(order) + 0.5) * 255 / order ** 2
+    thresholds = np.tile(matrix, (height // order + 1, width // order + 1))[:height, :width]
+    thresholds.flags.writeable = False
+    return thresholds
+
+
+def ordered_dither(levels: np.ndarray) -> np.ndarray:
+    return levels > bayer_thresholds(*levels.shape)
+
+
+def error_diffusion(levels: np.ndarray, mode="floyd-steinberg") -> np.ndarray:
+    """
+    Error diffusion in raster order.
+
+    Each pixel depends on the ones before it, so this can't be a whole-array
+    operation; it runs over a flat, padded Python list instead, which is much
+    cheaper per pixel than indexing a numpy array.
+    """
+    kernel, divisor = DIFFUSION_KERNELS[mode]
+    height, width = levels.shape
+    stride = width + 2 * PAD
+
+    buffer = np.zeros((height + PAD, stride))
+    buffer[:height, PAD:PAD + width] = levels
+    values = buffer.ravel().tolist()
+    spread = [(dy * stride + dx, weight / divisor) for dx, dy, weight in kernel]
+
+    out = bytearray(height * width)
+    for y in range(height):
+        start = y * stride + PAD
+        row = y * width
+        for x in range(width):
+            value = values[start + x]
+            if value > 127.5:
+                out[row + x] = 1
+                error = value - 255
+            else:
+                error = value
+            if error:
+                for offset, weight in spread:
+                    values[start + x + offset] += error * weight
+
+    return np.frombuffer(out, dtype=np.uint8).reshape(height, width) != 0
+
+
+def dither_plane(intensity: np.ndarray, threshold=50, invert=False, mode="bayer") -> np.ndarray:
+    """
+    Binarize an intensity plane with ordered (``bayer``) or error diffusion
+    (``floyd-steinberg``, ``atkinson``) dithering.
+    """
+    levels = dither_levels(intensity, threshold, invert)
+    if mode == "bayer":
+        return ordered_dither(levels)
+    if mode in DIFFUSION_KERNELS:
+        return error_diffusion(levels, mode)
+    raise ValueError(f"Unknown dither mode {mode}, expected one of {', '.join(DITHER_MODES)}")
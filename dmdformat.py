@@ -0,0 +1,241 @@
+import mmap
+import functools
+import struct
+
+import numpy as np
+
+PAGE_WIDTH = 32
+PAGE_HEIGHT = 32
+PAGE_PIXELS = PAGE_WIDTH * PAGE_HEIGHT
+
+FORMAT_V1 = 1
+FORMAT_V2 = 2
+FORMAT_V3 = 3
+
+# DMD v3: magic, version, width, height, page time multiplier, bits per pixel
+V3_MAGIC = b"DMD"
+V3_HEADER = struct.Struct("<3sBHHBB")
+
+# bits per pixel of multi-level v3 pages, stored as that many bit-planes
+MAX_DEPTH = 8
+
+# page time multipliers are stored in one byte
+MAX_TIMEMULT = 255
+
+
+def plane_bytes(plane: np.ndarray) -> bytes:
+    """
+    One byte per pixel (0 = OFF, 1 = ON), row-major. This is the v1 page and the v2 payload.
+    """
+    return plane.astype(np.uint8).tobytes()
+
+
+def plane_from_bytes(data, width=PAGE_WIDTH, height=PAGE_HEIGHT, depth=1) -> np.ndarray:
+    """
+    Inverse of ``plane_bytes``, an on/off plane or for ``depth`` > 1 a level plane.
+    """
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+    return pixels != 0x00 if depth == 1 else pixels.copy()
+
+
+def check_timemult(timemult):
+    if not 0 <= timemult <= MAX_TIMEMULT:
+        raise ValueError(f"Page time multiplier must be 0~{MAX_TIMEMULT}, Got {timemult}")
+
+
+def parse_timemult(text):
+    """
+    Parse a page time multiplier, for argparse.
+    """
+    timemult = int(text)
+    check_timemult(timemult)
+    return timemult
+
+
+def check_depth(depth):
+    if not 1 <= depth <= MAX_DEPTH:
+        raise ValueError(f"Pages have 1~{MAX_DEPTH} bits per pixel, Got {depth}")
+
+
+@functools.lru_cache(maxsize=MAX_DEPTH)
+def bit_weights(depth) -> np.ndarray:
+    """
+    (depth, 1) column of bit values, most significant first.
+    """
+    weights = (1 << np.arange(depth - 1, -1, -1)).astype(np.uint8)[:, None]
+    weights.flags.writeable = False
+    return weights
+
+
+def bit_planes(levels: np.ndarray, depth) -> bytes:
+    """
+    Pack a level plane (0 ~ 2**depth - 1) into ``depth`` bit-planes, most
+    significant first, each row-major and padded to a whole byte.
+
+    Shown for 2**bit time slots each, the planes make up the levels by
+    binary code modulation.
+    """
+    return np.packbits((levels.reshape(1, -1) & bit_weights(depth)) != 0, axis=1).tobytes()
+
+
+def levels_from_bit_planes(pixels: np.ndarray, width, height, depth) -> np.ndarray:
+    bits = np.unpackbits(pixels.reshape(depth, -1), axis=1, count=width * height)
+    return (bits * bit_weights(depth)).sum(axis=0, dtype=np.uint8).reshape(height, width)
+
+
+def encode_page_v2(plane: np.ndarray, timemult=1) -> bytes:
+    if plane.shape != (PAGE_HEIGHT, PAGE_WIDTH):
+        raise ValueError(f"DMD v2 pages are {PAGE_WIDTH}x{PAGE_HEIGHT}, Got {plane.shape[1]}x{plane.shape[0]}")
+    return bytes((timemult,)) + plane_bytes(plane)
+
+
+def encode_page_v3(plane: np.ndarray, timemult=1, depth=1) -> bytes:
+    height, width = plane.shape
+    header = V3_HEADER.pack(V3_MAGIC, FORMAT_V3, width, height, timemult, depth)
+    if depth == 1:
+        return header + np.packbits(plane).tobytes()
+    check_depth(depth)
+    return header + bit_planes(plane, depth)
+
+
+def encode_page(plane: np.ndarray, timemult=1, version=FORMAT_V3, depth=1) -> bytes:
+    """
+    Encode an on/off plane as a DMD page.
+
+    Parameters
+    ----------
+    plane : np.ndarray
+        Boolean on/off plane, or for ``depth`` > 1 a level plane (0 ~ 2**depth - 1).
+    timemult : int
+        Page time multiplier.
+    version : int
+        FORMAT_V3 (bit-packed, default) or FORMAT_V2 (legacy, one byte per pixel).
+    depth : int
+        Bits per pixel, v3 only.
+
+    Raises
+    ------
+    ValueError
+        For a time multiplier that doesn't fit its byte, or an unknown version.
+    """
+    check_timemult(timemult)
+    if version == FORMAT_V2:
+        if depth != 1:
+            raise ValueError("DMD v2 pages are 1 bit per pixel, multi-level pages need v3")
+        return encode_page_v2(plane, timemult)
+    if version == FORMAT_V3:
+        return encode_page_v3(plane, timemult, depth)
+    raise ValueError(f"Unknown DMD format version {version}")
+
+
+def is_v3(data) -> bool:
+    return len(data) >= V3_HEADER.size and bytes(data[:len(V3_MAGIC)]) == V3_MAGIC
+
+
+def page_layout(data):
+    """
+    Validate a v3 (bit-packed), v2 (1025 byte) or v1 (1024 byte) DMD page.
+
+    Returns
+    -------
+    tuple
+        (version, width, height, time multiplier, pixel data offset, bits per
+        pixel), the time multiplier is None for v1 pages.
+
+    Raises
+    ------
+    ValueError
+        If the data isn't a valid page.
+    """
+    if is_v3(data):
+        _, version, width, height, timemult, depth = V3_HEADER.unpack_from(data)
+        if version != FORMAT_V3 or not 1 <= depth <= MAX_DEPTH:
+            raise ValueError(f"Unsupported DMD v{version} page with {depth} bits per pixel")
+        expected = V3_HEADER.size + depth * ((width * height + 7) // 8)
+        if len(data) != expected:
+            raise ValueError(f"Image is corrupt\nExpected {expected} bytes, Got {len(data)} bytes")
+        return FORMAT_V3, width, height, timemult, V3_HEADER.size, depth
+
+    if len(data) == PAGE_PIXELS + 1:
+        return FORMAT_V2, PAGE_WIDTH, PAGE_HEIGHT, data[0], 1, 1
+    if len(data) == PAGE_PIXELS:
+        return FORMAT_V1, PAGE_WIDTH, PAGE_HEIGHT, None, 0, 1
+    raise ValueError(f"Image is corrupt\nExpected 1025/1024 bytes, Got {len(data)} bytes")
+
+
+def pixel_view(data, layout) -> np.ndarray:
+    """
+    Zero-copy uint8 view of a page's pixel data: one byte per pixel for v1/v2,
+    packed bits for v3.
+    """
+    version, width, height, _, offset, _ = layout
+    if version == FORMAT_V3:
+        return np.frombuffer(data, dtype=np.uint8, offset=offset)
+    return np.frombuffer(data, dtype=np.uint8, offset=offset).reshape(height, width)
+
+
+def view_to_plane(pixels: np.ndarray, layout) -> np.ndarray:
+    version, width, height, _, _, depth = layout
+    if depth > 1:
+        return levels_from_bit_planes(pixels, width, height, depth)
+    if version == FORMAT_V3:
+        return np.unpackbits(pixels, count=width * height).reshape(height, width) != 0
+    return pixels != 0x00
+
+
+def decode_page(data):
+    """
+    Decode a v3 (bit-packed), v2 (1025 byte) or v1 (1024 byte) DMD page.
+
+    Returns
+    -------
+    tuple
+        (on/off plane, time multiplier), the time multiplier is None for v1
+        pages. Multi-level pages decode to a level plane instead, see
+        ``page_layout`` for their depth.
+
+    Raises
+    ------
+    ValueError
+        If the data isn't a valid page.
+    """
+    layout = page_layout(data)
+    return view_to_plane(pixel_view(data, layout), layout), layout[3]
+
+
+class PageFile:
+    """
+    A DMD page file mapped into memory once and validated on open.
+
+    ``pixels`` is a zero-copy view of the page data in the map, ``plane()``
+    decodes it without touching the file again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            try:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("Image is corrupt\nFile is empty")
+
+        try:
+            self.layout = page_layout(self.map)
+        except ValueError:
+            self.map.close()
+            raise
+        self.version, self.width, self.height, self.timemult, _, self.depth = self.layout
+        self.pixels = pixel_view(self.map, self.layout)
+
+    def plane(self) -> np.ndarray:
+        return view_to_plane(self.pixels, self.layout)
+
+    def close(self):
+        self.pixels = None
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,160 @@
+import os
+import argparse
+import contextlib
+
+from PIL import Image, ImageSequence
+
+from dmdcore import convert_plane, parse_size, PAGE_SIZE, RESIZE_POLICIES, DITHER_MODES
+from dmdbatch import RASTER_EXTENSIONS
+from dmdformat import FORMAT_V2, FORMAT_V3, MAX_TIMEMULT, encode_page
+from dmdpack import PackWriter, PACK_EXTENSION
+from dmdanim import AnimationEncoder, ANIM_EXTENSION, DEFAULT_KEYFRAME_INTERVAL
+
+DEFAULT_BASE_MS = 100
+
+DUPLICATE_MODES = ("merge", "skip", "keep")
+
+
+def source_frames(path):
+    """
+    Yield (frame, duration in ms or None) one frame at a time from an animated
+    GIF/APNG/WebP/TIFF, a still image or a directory of images in file name order.
+    """
+    if os.path.isdir(path):
+        for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+            if entry.is_file() and entry.name.lower().endswith(RASTER_EXTENSIONS):
+                with Image.open(entry.path) as image:
+                    yield image, image.info.get("duration")
+        return
+
+    with Image.open(path) as image:
+        for frame in ImageSequence.Iterator(image):
+            yield frame, frame.info.get("duration")
+
+
+def timemult_for(duration, base_ms=DEFAULT_BASE_MS):
+    if not duration:
+        return 1
+    return max(1, min(MAX_TIMEMULT, round(duration / base_ms)))
+
+
+def page_frames(frames, threshold=50, invert=False, base_ms=DEFAULT_BASE_MS, duplicates="merge", size=PAGE_SIZE,
+                policy="fit", dither="none"):
+    """
+    Convert frames to (plane, time multiplier) pages, resizing them to ``size`` with ``policy``.
+
+    Consecutive identical pages are merged into one page with their durations
+    added (``merge``), dropped (``skip``) or kept (``keep``). Only the previous
+    page is held, so memory use doesn't grow with the clip.
+    """
+    pending = None
+    pending_duration = 0
+    for frame, duration in frames:
+        plane = convert_plane(frame, threshold, invert, size, policy, dither)
+        duration = duration or base_ms
+
+        if pending is not None and duplicates != "keep" and (plane == pending).all():
+            if duplicates == "merge":
+                pending_duration += duration
+            continue
+
+        if pending is not None:
+            yield pending, timemult_for(pending_duration, base_ms)
+        pending, pending_duration = plane, duration
+
+    if pending is not None:
+        yield pending, timemult_for(pending_duration, base_ms)
+
+
+class DirectoryWriter:
+    def __init__(self, directory, version=FORMAT_V3):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.version = version
+        self.count = 0
+
+    def add(self, plane, timemult=1):
+        with open(os.path.join(self.directory, f"{self.count:04d}.dmd"), "wb") as file:
+            file.write(encode_page(plane, timemult, self.version))
+        self.count += 1
+
+
+@contextlib.contextmanager
+def page_writer(output, version=FORMAT_V3, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, size=PAGE_SIZE):
+    """
+    A writer with ``add(plane, timemult)`` chosen by the output extension:
+    a pack, an animation, or otherwise a directory of .dmd pages.
+    """
+    if output.lower().endswith(PACK_EXTENSION):
+        with PackWriter(output, *size) as writer:
+            yield writer
+    elif output.lower().endswith(ANIM_EXTENSION):
+        # written aside and renamed over the output, a failed import leaves no headerless animation behind
+        with open(output + ".tmp", "wb") as file:
+            try:
+                writer = AnimationEncoder(file, *size, keyframe_interval=keyframe_interval)
+                yield writer
+                writer.close()
+            except BaseException:
+                file.close()
+                os.remove(output + ".tmp")
+                raise
+        os.replace(output + ".tmp", output)
+    else:
+        yield DirectoryWriter(output, version)
+
+
+def import_frames(source, output, threshold=50, invert=False, base_ms=DEFAULT_BASE_MS, duplicates="merge",
+                  version=FORMAT_V3, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, size=PAGE_SIZE, policy="fit",
+                  dither="none"):
+    """
+    Stream the frames of ``source`` into ``output``, writing each page as soon as it is known.
+
+    Returns
+    -------
+    tuple
+        (frames read, pages written)
+    """
+    frames_read = 0
+
+    def counted(frames):
+        nonlocal frames_read
+        for frame in frames:
+            frames_read += 1
+            yield frame
+
+    pages = 0
+    with page_writer(output, version, keyframe_interval, size) as writer:
+        for plane, timemult in page_frames(counted(source_frames(source)), threshold, invert, base_ms, duplicates,
+                                           size, policy, dither):
+            writer.add(plane, timemult)
+            pages += 1
+    return frames_read, pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import animated GIF/APNG files or image sequences as DMD pages')
+    parser.add_argument("input", help="animated image, still image or directory of images")
+    parser.add_argument("output", help=f"output directory of .dmd pages, {PACK_EXTENSION} pack "
+                                       f"or {ANIM_EXTENSION} animation")
+    parser.add_argument("--threshold", default=50, type=int, help="on/off threshold (0~255)")
+    parser.add_argument("--invert", default=False, type=bool, help="invert on/off pixels")
+    parser.add_argument("--base-ms", default=DEFAULT_BASE_MS, type=int,
+                        help="frame duration of a page time multiplier of 1")
+    parser.add_argument("--duplicates", default="merge", choices=DUPLICATE_MODES,
+                        help="merge, skip or keep identical consecutive pages")
+    parser.add_argument("--keyframe-interval", default=DEFAULT_KEYFRAME_INTERVAL, type=int,
+                        help=f"frames between keyframes for {ANIM_EXTENSION} output")
+    parser.add_argument("--legacy", action="store_true", help="write DMD v2 pages for older loaders")
+    parser.add_argument("--size", default=PAGE_SIZE, type=parse_size, help="page size, WIDTHxHEIGHT (default: 32x32)")
+    parser.add_argument("--resize", default="fit", choices=RESIZE_POLICIES,
+                        help="fit, fill or crop frames that aren't the page size")
+    parser.add_argument("--dither", default="none", choices=DITHER_MODES, help="dithering instead of a plain threshold")
+    args = parser.parse_args()
+    if args.legacy and tuple(args.size) != PAGE_SIZE:
+        parser.error(f"DMD v2 pages are {PAGE_SIZE[0]}x{PAGE_SIZE[1]}, --legacy can't be combined with --size")
+
+    frames, pages = import_frames(args.input, args.output, args.threshold, args.invert, args.base_ms,
+                                  args.duplicates, FORMAT_V2 if args.legacy else FORMAT_V3,
+                                  args.keyframe_interval, args.size, args.resize, args.dither)
+    print(f"Imported {frames} frames as {pages} pages into {args.output}")
@@ -0,0 +1,243 @@
+import os
+import sys
+import mmap
+import struct
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from dmdcore import convert_plane
+from dmdbatch import RASTER_EXTENSIONS
+from dmdformat import (PAGE_WIDTH, PAGE_HEIGHT, FORMAT_V2, FORMAT_V3, encode_page, decode_page, check_timemult,
+                       parse_timemult)
+
+PACK_EXTENSION = ".dmdp"
+
+# magic, version, flags, page width, page height, page count, index offset
+PACK_MAGIC = b"DMDP"
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct("<4sBBHHII")
+
+# one entry per page: data offset, data length, page time multiplier
+INDEX_DTYPE = np.dtype([("offset", "<u4"), ("length", "<u4"), ("timemult", "u1")])
+
+
+class PackWriter:
+    """
+    Streams pages into a pack file. Page data is written as it is added and
+    the index is appended on close, so the page count needn't be known up front.
+    """
+
+    def __init__(self, path, width=PAGE_WIDTH, height=PAGE_HEIGHT):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.index = []
+        self.file = open(path + ".tmp", "wb")
+        self.file.write(bytes(PACK_HEADER.size))
+
+    def add(self, plane: np.ndarray, timemult=1):
+        if plane.dtype != np.bool_:
+            raise ValueError("Packs hold 1 bit pages, multi-level pages can't be packed")
+        if plane.shape != (self.height, self.width):
+            raise ValueError(f"Page is {plane.shape[1]}x{plane.shape[0]}, pack is {self.width}x{self.height}")
+        check_timemult(timemult)
+        data = np.packbits(plane).tobytes()
+        self.index.append((self.file.tell(), len(data), timemult))
+        self.file.write(data)
+
+    def close(self):
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.seek(0)
+        self.file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, self.width, self.height, len(self.index),
+                                         index_offset))
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.path + ".tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def pack_bytes(pages, width=PAGE_WIDTH, height=PAGE_HEIGHT) -> bytes:
+    """
+    A whole pack in memory, from (plane, time multiplier) pairs, laid out as ``PackWriter`` writes it.
+    """
+    data = []
+    index = []
+    offset = PACK_HEADER.size
+    for plane, timemult in pages:
+        if plane.dtype != np.bool_:
+            raise ValueError("Packs hold 1 bit pages, multi-level pages can't be packed")
+        if plane.shape != (height, width):
+            raise ValueError(f"Page is {plane.shape[1]}x{plane.shape[0]}, pack is {width}x{height}")
+        check_timemult(timemult)
+        page = np.packbits(plane).tobytes()
+        index.append((offset, len(page), timemult))
+        data.append(page)
+        offset += len(page)
+    header = PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, width, height, len(index), offset)
+    return b"".join([header, *data, np.array(index, dtype=INDEX_DTYPE).tobytes()])
+
+
+class PackReader:
+    """
+    Random access to the pages of a pack through a read-only memory map.
+    Only the header and index are parsed on open, ``page(n)`` touches page n alone.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(self.map) < PACK_HEADER.size:
+                raise ValueError("Pack is corrupt\nFile is shorter than the header")
+            magic, version, _, self.width, self.height, count, index_offset = PACK_HEADER.unpack_from(self.map)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"Not a DMD pack (version {PACK_VERSION})")
+            if index_offset + count * INDEX_DTYPE.itemsize > len(self.map):
+                raise ValueError("Pack is corrupt\nIndex runs past the end of the file")
+            self.index = np.frombuffer(self.map, dtype=INDEX_DTYPE, count=count, offset=index_offset)
+        except ValueError:
+            self.map.close()
+            raise
+
+    def __len__(self):
+        return len(self.index)
+
+    def raw(self, n) -> memoryview:
+        offset, length, _ = self.index[n]
+        return memoryview(self.map)[offset:offset + length]
+
+    def timemult(self, n) -> int:
+        return int(self.index[n]["timemult"])
+
+    def page(self, n):
+        """
+        Returns
+        -------
+        tuple
+            (on/off plane, time multiplier) of page ``n``.
+        """
+        pixels = self.width * self.height
+        bits = np.unpackbits(np.frombuffer(self.raw(n), dtype=np.uint8), count=pixels)
+        return bits.reshape(self.height, self.width) != 0, self.timemult(n)
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self.page(n)
+
+    def close(self):
+        self.index = None
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def page_sources(directory):
+    """
+    Page files of a directory in playback (file name) order.
+    """
+    return [entry.path for entry in sorted(os.scandir(directory), key=lambda entry: entry.name)
+            if entry.is_file() and entry.name.lower().endswith(RASTER_EXTENSIONS + (".dmd",))]
+
+
+def load_page(path, threshold=50, invert=False, timemult=None):
+    """
+    Read a .dmd page or convert a raster image.
+
+    Returns (plane, time multiplier); ``timemult`` overrides the one stored in .dmd pages.
+    """
+    if path.lower().endswith(".dmd"):
+        with open(path, "rb") as file:
+            plane, stored = decode_page(file.read())
+        return plane, timemult or stored or 1
+
+    with Image.open(path) as image:
+        return convert_plane(image, threshold, invert), timemult or 1
+
+
+def build_pack(path, sources, threshold=50, invert=False, timemult=None):
+    with PackWriter(path) as writer:
+        for source in sources:
+            writer.add(*load_page(source, threshold, invert, timemult))
+    return len(writer.index)
+
+
+def extract_pack(path, dir_out, version=FORMAT_V3):
+    os.makedirs(dir_out, exist_ok=True)
+    with PackReader(path) as reader:
+        digits = max(4, len(str(len(reader) - 1)))
+        for n, (plane, timemult) in enumerate(reader):
+            with open(os.path.join(dir_out, f"{n:0{digits}d}.dmd"), "wb") as file:
+                file.write(encode_page(plane, timemult, version))
+        return len(reader)
+
+
+def page_text(plane: np.ndarray) -> str:
+    return "\n".join("".join("#" if pixel else "." for pixel in row) for row in plane)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build, list and extract DMD page packs')
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    build_parser = subparsers.add_parser("build", help="pack a directory of .dmd pages and raster images")
+    build_parser.add_argument("dir_in", help="page directory, pages are packed in file name order")
+    build_parser.add_argument("pack", help="output pack")
+    build_parser.add_argument("--threshold", default=50, type=int, help="on/off threshold for rasters (0~255)")
+    build_parser.add_argument("--invert", default=False, type=bool, help="invert on/off pixels of rasters")
+    build_parser.add_argument("--timemult", default=None, type=parse_timemult,
+                              help="page time multiplier for every page (default: stored value, or 1)")
+
+    list_parser = subparsers.add_parser("list", help="list the pages of a pack")
+    list_parser.add_argument("pack")
+
+    extract_parser = subparsers.add_parser("extract", help="write every page of a pack to a directory")
+    extract_parser.add_argument("pack")
+    extract_parser.add_argument("dir_out")
+    extract_parser.add_argument("--legacy", action="store_true", help="write DMD v2 pages for older loaders")
+
+    show_parser = subparsers.add_parser("show", help="print a page of a pack")
+    show_parser.add_argument("pack")
+    show_parser.add_argument("page", type=int)
+
+    args = parser.parse_args()
+
+    if args.action == "build":
+        try:
+            count = build_pack(args.pack, page_sources(args.dir_in), args.threshold, args.invert, args.timemult)
+        except (OSError, ValueError) as e:
+            print(f"Failed to pack {args.dir_in}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Packed {count} pages into {args.pack}")
+    elif args.action == "list":
+        with PackReader(args.pack) as pack:
+            print(f"{len(pack)} pages, {pack.width}x{pack.height}")
+            for n, (offset, length, timemult) in enumerate(pack.index):
+                print(f"{n:6d}  offset {offset:8d}  length {length:4d}  time multiplier {timemult}")
+    elif args.action == "extract":
+        count = extract_pack(args.pack, args.dir_out, FORMAT_V2 if args.legacy else FORMAT_V3)
+        print(f"Extracted {count} pages to {args.dir_out}")
+    elif args.action == "show":
+        with PackReader(args.pack) as pack:
+            plane, timemult = pack.page(args.page)
+            print(f"Page {args.page}, time multiplier {timemult}")
+            print(page_text(plane))
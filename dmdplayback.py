@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+from dmdformat import decode_page, page_layout
+from dmdpack import PackReader, page_sources, load_page
+from dmdimport import DEFAULT_BASE_MS
+
+
+def read_page(path):
+    """
+    Bytes of a .dmd page, or None for a raster image that is converted when it is shown.
+    """
+    if not path.lower().endswith(".dmd"):
+        return None
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def page_timemult(data) -> int:
+    """
+    Stored time multiplier of a page, 1 for raster images, v1 pages and a stored 0, as ``load_page`` does.
+    """
+    if data is None:
+        return 1
+    return page_layout(data)[3] or 1
+
+
+class PageSequence:
+    """
+    The pages of a directory (in file name order) or a pack, for playback.
+
+    Only the timing of each page is worked out up front, ``page(n)`` decodes
+    page n alone and is safe to call from render threads.
+    """
+
+    def __init__(self, path, threshold=50, invert=False):
+        self.path = path
+        self.threshold = threshold
+        self.invert = invert
+        self.pack = None
+        if os.path.isdir(path):
+            self.sources = page_sources(path)
+            # pages are a few hundred bytes, reading them once beats reopening thousands of files while playing
+            self.data = [read_page(source) for source in self.sources]
+            self.timemults = np.array([page_timemult(data) for data in self.data], dtype=np.int64)
+        else:
+            self.pack = PackReader(path)
+            self.timemults = np.maximum(self.pack.index["timemult"], 1).astype(np.int64)
+
+    def __len__(self):
+        return len(self.timemults)
+
+    def page(self, n):
+        """
+        Returns
+        -------
+        tuple
+            (on/off or level plane, bits per pixel) of page ``n``.
+        """
+        if self.pack is not None:
+            return self.pack.page(n)[0], 1
+        data = self.data[n]
+        if data is None:
+            return load_page(self.sources[n], self.threshold, self.invert)[0], 1
+        return decode_page(data)[0], page_layout(data)[5]
+
+    def close(self):
+        if self.pack is not None:
+            self.pack.close()
+
+
+def page_starts(timemults, step_ms=DEFAULT_BASE_MS) -> np.ndarray:
+    """
+    Start time in seconds of every page played back to back, followed by the
+    end of the last page. A time multiplier of 1 lasts ``step_ms``.
+    """
+    return np.concatenate(([0], np.cumsum(timemults))) * step_ms / 1000
+
+
+def page_at(starts, seconds) -> int:
+    """
+    Index of the page showing ``seconds`` into playback, see ``page_starts``.
+    """
+    return min(int(np.searchsorted(starts, seconds, side="right")) - 1, len(starts) - 2)
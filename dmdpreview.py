@@ -0,0 +1,81 @@
+import functools
+
+import numpy as np
+
+from dmdcore import PAGE_WIDTH
+
+PREVIEW_SIZE = 256
+PREVIEW_BORDER = 4
+
+OFF_COLOUR = (0, 0, 0)
+
+# palette index of unlit LEDs in the composited selector plane, lit LEDs
+# take their level and the border the index after the brightest level
+_OFF = 0
+
+
+@functools.lru_cache(maxsize=16)
+def led_grid_mask(size=PREVIEW_SIZE, border=PREVIEW_BORDER, levels=2):
+    """
+    Selector plane for the border of the LED grid, already shifted by
+    ``border // 2`` so the grid is centred.
+
+    Returns a read-only (size, size) integer array holding the border palette
+    index (``levels``) on border pixels and 0 on LED pixels.
+    """
+    cell = size // PAGE_WIDTH
+    coords = np.arange(size) + border // 2
+    led = (coords % cell >= border) & (coords < size)
+
+    mask = np.where(led[:, None] & led[None, :], _OFF, levels).astype(np.min_scalar_type(levels))
+    mask.flags.writeable = False
+    return mask
+
+
+@functools.lru_cache(maxsize=16)
+def led_palette(on_colour, border_colour, off_colour=OFF_COLOUR, levels=2):
+    """
+    ``levels`` LED shades from ``off_colour`` to ``on_colour``, then the border colour.
+    """
+    ramp = np.linspace(0, 1, levels)[:, None]
+    shades = np.rint(np.array(off_colour) * (1 - ramp) + np.array(on_colour) * ramp)
+    palette = np.vstack([shades, [border_colour]]).astype(np.uint8)
+    palette.flags.writeable = False
+    return palette
+
+
+def render_led_grid(plane: np.ndarray, on_colour, border_colour, size=PREVIEW_SIZE, border=PREVIEW_BORDER,
+                    off_colour=OFF_COLOUR, depth=1) -> np.ndarray:
+    """
+    Render an on/off or level plane as a grid of LEDs.
+
+    The page is block-upscaled to ``size`` and composited with the cached
+    border mask, so only the LED state changes between renders.
+
+    Parameters
+    ----------
+    plane : np.ndarray
+        (32, 32) boolean on/off plane, or uint8 level plane for a ``depth`` over 1.
+    on_colour, border_colour : tuple
+        RGB colours of lit LEDs and the grid.
+    size : int
+        Canvas width and height, a multiple of 32.
+    border : int
+        Grid line width in pixels.
+    depth : int
+        Bits per pixel of ``plane``, levels are shaded between off and on.
+
+    Returns
+    -------
+    np.ndarray
+        (size, size, 3) uint8 RGB image.
+    """
+    cell = size // PAGE_WIDTH
+    shift = border // 2
+
+    lit = np.zeros((size, size), dtype=np.uint8)
+    lit[:size - shift, :size - shift] = plane.astype(np.uint8).repeat(cell, 0).repeat(cell, 1)[shift:, shift:]
+
+    levels = 2 ** depth
+    mask = led_grid_mask(size, border, levels)
+    return led_palette(tuple(on_colour), tuple(border_colour), tuple(off_colour), levels)[np.maximum(mask, lit)]
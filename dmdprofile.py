@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import atexit
+
+# "1" or "true" prints a report at exit, "", "0" and "false" leave profiling off,
+# anything else is also taken as a JSON file to dump the report to
+ENV_VAR = "DMD_PROFILE"
+ENV_OFF = ("", "0", "false")
+ENV_ON = ("1", "true")
+
+PERCENTILES = (50, 90, 99)
+
+enabled = False
+
+_samples = {}
+_registered = False
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _samples.setdefault(self.name, []).append(time.perf_counter() - self.start)
+
+
+class _Disabled:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_DISABLED = _Disabled()
+
+
+def stage(name):
+    """
+    Time the body of a ``with`` block as one sample of ``name``. While
+    profiling is off this returns a shared no-op context.
+    """
+    if not enabled:
+        return _DISABLED
+    return _Stage(name)
+
+
+def enable(dump=None):
+    """
+    Start collecting samples and report them at exit, to stderr and to the
+    JSON file ``dump`` if given.
+
+    The environment variable is set too, so worker processes collect samples
+    for the parent to ``merge``.
+    """
+    import multiprocessing
+
+    global enabled, _registered
+    enabled = True
+    os.environ[ENV_VAR] = dump or "1"
+    if not _registered and multiprocessing.parent_process() is None:
+        atexit.register(report, dump)
+        _registered = True
+
+
+def drain() -> dict:
+    """
+    Take the samples collected so far, leaving none behind.
+    """
+    samples = dict(_samples)
+    _samples.clear()
+    return samples
+
+
+def reset():
+    """
+    Drop the samples collected so far. Pool workers start with this, a forked
+    worker would otherwise hand the parent's own samples back with its first ``drain``.
+    """
+    _samples.clear()
+
+
+def merge(samples: dict):
+    for name, times in samples.items():
+        _samples.setdefault(name, []).extend(times)
+
+
+def summary() -> dict:
+    """
+    Per stage count, total, mean, percentiles and maximum, in seconds.
+    """
+    import numpy as np
+
+    stages = {}
+    for name, times in _samples.items():
+        times = np.asarray(times)
+        stages[name] = {"count": len(times), "total": float(times.sum()), "mean": float(times.mean()),
+                        **{f"p{p}": float(np.percentile(times, p)) for p in PERCENTILES},
+                        "max": float(times.max())}
+    return stages
+
+
+def report(dump=None, file=None):
+    stages = summary()
+    if not stages:
+        return
+    file = file or sys.stderr
+
+    print(f"{'stage':<20} {'count':>8} {'total ms':>10} {'mean us':>9}"
+          + "".join(f" {f'p{p} us':>9}" for p in PERCENTILES) + f" {'max us':>9}", file=file)
+    for name, stats in sorted(stages.items(), key=lambda item: -item[1]["total"]):
+        print(f"{name:<20} {stats['count']:8d} {stats['total'] * 1e3:10.1f} {stats['mean'] * 1e6:9.1f}"
+              + "".join(f" {stats[f'p{p}'] * 1e6:9.1f}" for p in PERCENTILES) + f" {stats['max'] * 1e6:9.1f}",
+              file=file)
+
+    if dump:
+        with open(dump, "w") as out:
+            json.dump(stages, out, indent=1, sort_keys=True)
+
+
+def add_argument(parser):
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="FILE",
+                        help=f"time each conversion stage and report at exit, optionally dumping JSON to FILE "
+                             f"(or set {ENV_VAR})")
+
+
+def enable_from_args(args):
+    if args.profile is not None:
+        enable(args.profile or None)
+
+
+def enable_from_env():
+    value = os.environ.get(ENV_VAR, "").strip()
+    if value.lower() not in ENV_OFF:
+        enable(None if value.lower() in ENV_ON else value)
+
+
+enable_from_env()
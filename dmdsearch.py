@@ -0,0 +1,182 @@
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+# terms shorter than a trigram are matched against word prefixes instead
+GRAM = 3
+
+# sorts after every string that starts with the one it is appended to
+LAST = "\U0010ffff"
+
+NO_IDS = np.zeros(0, dtype=np.int32)
+
+# above this many entries left to rank, names are searched as an array rather than one by one
+SCAN_LIMIT = 4000
+
+
+def trigrams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class Postings:
+    """
+    Sorted unique tokens and the entries containing each, stored end to end
+    in one array. The tokens starting with a prefix are a contiguous run of
+    the sorted list, so their entries are one slice of that array.
+    """
+
+    def __init__(self, words_per_entry):
+        tokens = {}
+        for n, words in enumerate(words_per_entry):
+            for word in set(words):
+                tokens.setdefault(word, []).append(n)
+        self.tokens = sorted(tokens)
+        lists = [tokens[token] for token in self.tokens]
+        self.starts = np.concatenate(([0], np.cumsum([len(ids) for ids in lists]))).astype(np.int64)
+        self.ids = np.fromiter((n for ids in lists for n in ids), dtype=np.int32, count=self.starts[-1])
+
+    def prefix_ids(self, term) -> np.ndarray:
+        """
+        Entries (with repeats) with a token starting with ``term``.
+        """
+        start = self.starts[bisect_left(self.tokens, term)]
+        end = self.starts[bisect_left(self.tokens, term + LAST)]
+        return self.ids[start:end]
+
+
+class SearchIndex:
+    """
+    Ranked search over page names and tags, built once.
+
+    A query is split into terms and an entry matches when every term is a
+    substring of its name or tags (terms of three or more characters, through
+    a trigram index) or a prefix of one of its words (shorter terms, through
+    a sorted token list). Matches are ranked exact name, name prefix, word
+    prefixes, name substrings, then tag only, each in entry order.
+
+    Matches and rank classes are boolean masks over the entries, so a term
+    matching every entry costs a few array operations rather than a set
+    element per entry, and each class comes out in entry order. With a
+    ``limit``, classes past the ones that fill it are never worked out.
+    """
+
+    def __init__(self, names, tags=None):
+        """
+        Parameters
+        ----------
+        names : list of str
+            Entry names, results are indexes into this list.
+        tags : list of iterable of str, optional
+            Extra search terms per entry.
+        """
+        self.names = [name.lower() for name in names]
+        self.text = [" ".join([name, *(tag.lower() for tag in tags[n])]) if tags else name
+                     for n, name in enumerate(self.names)]
+
+        grams = {}
+        for n, text in enumerate(self.text):
+            for gram in trigrams(text):
+                grams.setdefault(gram, []).append(n)
+        self.grams = {gram: np.array(ids, dtype=np.int32) for gram, ids in grams.items()}
+
+        self.words = Postings(WORD.findall(text) for text in self.text)
+        self.name_words = Postings(WORD.findall(name) for name in self.names)
+
+        self.name_order = np.array(sorted(range(len(self.names)), key=self.names.__getitem__), dtype=np.int32)
+        self.sorted_names = [self.names[n] for n in self.name_order]
+        self.name_array = np.array(self.names, dtype=str)
+
+    def __len__(self):
+        return len(self.names)
+
+    def mask(self, ids) -> np.ndarray:
+        mask = np.zeros(len(self.names), dtype=bool)
+        mask[ids] = True
+        return mask
+
+    def term_mask(self, term, within=None) -> np.ndarray:
+        """
+        Entries matching ``term``. Substrings longer than a trigram are checked
+        entry by entry, only among the trigram candidates ``within`` the entries given.
+        """
+        if len(term) < GRAM:
+            return self.mask(self.words.prefix_ids(term))
+
+        postings = sorted((self.grams.get(gram, NO_IDS) for gram in trigrams(term)), key=len)
+        mask = self.mask(postings[0])
+        for ids in postings[1:]:
+            mask &= self.mask(ids)
+        if within is not None:
+            mask &= within
+        if len(term) > GRAM:
+            candidates = np.flatnonzero(mask)
+            mask = self.mask(np.array([n for n in candidates.tolist() if term in self.text[n]], dtype=np.int32))
+        return mask
+
+    def term_cost(self, term) -> int:
+        """
+        Upper bound of the entries a term matches, from the index sizes alone.
+        """
+        if len(term) >= GRAM:
+            return min(len(self.grams.get(gram, NO_IDS)) for gram in trigrams(term))
+        return len(self.words.prefix_ids(term))
+
+    def name_range(self, start, end) -> np.ndarray:
+        return self.mask(self.name_order[bisect_left(self.sorted_names, start):bisect_left(self.sorted_names, end)])
+
+    def ranked(self, matches, query, terms, limit=None) -> list:
+        limit = len(self.names) if limit is None else limit
+        results = []
+
+        exact = self.name_range(query, query + "\0") & matches
+        prefix = self.name_range(query, query + LAST) & matches
+        words = matches.copy()
+        for term in terms:
+            words &= self.mask(self.name_words.prefix_ids(term))
+        for ids in (exact, prefix & ~exact, words & ~prefix):
+            results += np.flatnonzero(ids)[:limit - len(results)].tolist()
+            if len(results) >= limit:
+                return results
+
+        # names holding every term somewhere come before entries matched through their tags alone
+        rest = np.flatnonzero(matches & ~prefix & ~words)
+        if len(rest) > SCAN_LIMIT:
+            in_name = np.ones(len(rest), dtype=bool)
+            for term in terms:
+                in_name &= np.char.find(self.name_array[rest], term) >= 0
+            results += rest[in_name][:limit - len(results)].tolist()
+            return results + rest[~in_name][:limit - len(results)].tolist()
+
+        tag_only = []
+        for n in rest.tolist():
+            if all(term in self.names[n] for term in terms):
+                results.append(n)
+                if len(results) >= limit:
+                    return results
+            elif len(tag_only) < limit:
+                tag_only.append(n)
+        return results + tag_only[:limit - len(results)]
+
+    def search(self, query, limit=None) -> list:
+        """
+        Returns
+        -------
+        list of int
+            Indexes of the matching entries, best first, at most ``limit``. An
+            empty query matches every entry in order.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return list(range(len(self.names) if limit is None else min(limit, len(self.names))))
+
+        terms = query.split()
+        # the most selective term first, so long terms check as few entries as possible
+        ordered = sorted(terms, key=self.term_cost)
+        matches = self.term_mask(ordered[0])
+        for term in ordered[1:]:
+            matches &= self.term_mask(term, matches)
+
+        return self.ranked(matches, query, terms, limit)
@@ -0,0 +1,329 @@
+import os
+import queue
+import socket
+import threading
+import multiprocessing
+import socketserver
+import email.parser
+import email.policy
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from dmdcore import (source_plane, encode_page, parse_size, parse_timemult, PAGE_SIZE, RESIZE_POLICIES, DITHER_MODES,
+                     FORMAT_V3, MAX_DEPTH)
+from dmdbatch import worker_cache
+from dmdpack import pack_bytes
+import dmdprofile
+
+DEFAULT_PORT = 8032
+
+# most sources handed to a worker at once
+MAX_BATCH = 64
+
+MAX_BODY = 64 * 1024 * 1024
+
+
+def convert_chunk(chunk, cache_dir=None):
+    """
+    Convert a list of (source bytes, conversion options) in a pool worker.
+
+    Each source is converted on its own, so an image Pillow can't decode
+    (or refuses as a decompression bomb) fails only its own request, not
+    the others batched with it.
+
+    Returns
+    -------
+    tuple
+        ([(on/off plane, error)], profiling samples of this worker)
+    """
+    cache = worker_cache(cache_dir)
+    results = []
+    for source, options in chunk:
+        try:
+            results.append((source_plane(source, cache=cache, **options), None))
+        except Exception as e:
+            # an empty message would read as no error
+            results.append((None, str(e) or type(e).__name__))
+    return results, dmdprofile.drain()
+
+
+class Batcher:
+    """
+    Groups conversions submitted from many request threads into chunks for a
+    warm process pool, so each worker round trip carries many sources.
+
+    A dispatch thread waits for an idle worker, then hands it everything
+    queued since (up to ``max_batch`` sources). An idle service converts a
+    request straight away, and under load requests queue up while the
+    workers are busy and go out together.
+    """
+
+    def __init__(self, workers=None, cache_dir=None, max_batch=MAX_BATCH):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.idle = threading.Semaphore(self.workers)
+        self.pool = multiprocessing.Pool(self.workers, initializer=dmdprofile.reset) if self.workers > 1 else None
+        self.thread = threading.Thread(target=self.dispatch, name="dmd-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, sources, options) -> list:
+        """
+        Convert encoded images with the same options, blocking until all are done.
+
+        Returns
+        -------
+        list of tuple
+            (on/off plane, error) per source, in order.
+        """
+        futures = []
+        for source in sources:
+            future = Future()
+            self.queue.put((source, options, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def gather(self):
+        """
+        Returns
+        -------
+        tuple
+            (queued items, whether the batcher is closing)
+        """
+        batch = [self.queue.get()]
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch[-1] is None:
+            return batch[:-1], True
+        return batch, False
+
+    def dispatch(self):
+        closing = False
+        while not closing:
+            self.idle.acquire()
+            batch, closing = self.gather()
+            if not batch:
+                self.idle.release()
+                continue
+
+            chunk = [item[:2] for item in batch]
+            # nothing may escape, a dead dispatch thread never releases idle and every later request hangs
+            try:
+                if self.pool is None:
+                    self.complete(batch, convert_chunk(chunk, self.cache_dir))
+                    continue
+                self.pool.apply_async(convert_chunk, (chunk, self.cache_dir),
+                                      callback=lambda output, batch=batch: self.complete(batch, output),
+                                      error_callback=lambda error, batch=batch: self.fail(batch, error))
+            except Exception as e:
+                self.fail(batch, e)
+
+    def complete(self, batch, output):
+        results, samples = output
+        if dmdprofile.enabled:
+            dmdprofile.merge(samples)
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+        self.idle.release()
+
+    def fail(self, batch, error):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result((None, str(error) or type(error).__name__))
+        self.idle.release()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+
+def flag(value) -> bool:
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def request_options(query, defaults):
+    """
+    Conversion options from the query string, falling back to the server defaults.
+
+    Returns
+    -------
+    tuple
+        (options for ``source_plane``, time multiplier, page format version)
+    """
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+    options = dict(defaults)
+    if "threshold" in params:
+        options["threshold"] = int(params["threshold"])
+    if "invert" in params:
+        options["invert"] = flag(params["invert"])
+    if "size" in params:
+        options["size"] = parse_size(params["size"])
+    if "resize" in params:
+        if params["resize"] not in RESIZE_POLICIES:
+            raise ValueError(f"Unknown resize policy {params['resize']}, expected one of {', '.join(RESIZE_POLICIES)}")
+        options["policy"] = params["resize"]
+    if "dither" in params:
+        if params["dither"] not in DITHER_MODES:
+            raise ValueError(f"Unknown dither mode {params['dither']}, expected one of {', '.join(DITHER_MODES)}")
+        options["dither"] = params["dither"]
+    if "depth" in params:
+        options["depth"] = int(params["depth"])
+        if not 1 <= options["depth"] <= MAX_DEPTH:
+            raise ValueError(f"Pages have 1~{MAX_DEPTH} bits per pixel, Got {options['depth']}")
+
+    version = options.pop("version")
+    if "version" in params:
+        version = int(params["version"])
+    timemult = parse_timemult(params.get("timemult", "1"))
+    return options, timemult, version
+
+
+def multipart_sources(content_type, body):
+    """
+    Returns
+    -------
+    list of tuple
+        (part name, part data) of each part of a multipart/form-data body.
+    """
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    if not message.is_multipart():
+        raise ValueError("Batches must be multipart/form-data")
+    return [(part.get_filename() or part.get_param("name", header="content-disposition") or str(n),
+             part.get_payload(decode=True) or b"")
+            for n, part in enumerate(message.iter_parts())]
+
+
+class ConvertHandler(BaseHTTPRequestHandler):
+    """
+    ``POST /convert`` with an image body returns its DMD page, ``POST /batch``
+    with multipart/form-data images returns a DMD pack of them in order.
+    Options go in the query string: threshold, invert, timemult, version,
+    size, resize, dither and depth.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "dmdserve"
+
+    def setup(self):
+        # headers and body go out as separate writes, Nagle would hold the body back for the client's delayed ACK
+        self.disable_nagle_algorithm = self.request.family != socket.AF_UNIX
+        super().setup()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in ("/convert", "/batch"):
+            return self.reply(404, b"Not found\n", "text/plain")
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # the body can't be skipped without its length
+            self.close_connection = True
+            return self.reply(400, b"Invalid Content-Length\n", "text/plain")
+        if length > MAX_BODY:
+            self.close_connection = True
+            return self.reply(413, b"Request body too large\n", "text/plain")
+        body = self.rfile.read(length)
+
+        try:
+            options, timemult, version = request_options(url.query, self.server.defaults)
+            if url.path == "/convert":
+                sources = [("body", body)]
+            else:
+                sources = multipart_sources(self.headers.get("Content-Type", ""), body)
+        except ValueError as e:
+            return self.reply(400, f"{e}\n".encode(), "text/plain")
+
+        results = self.server.batcher.submit([data for _, data in sources], options)
+        errors = [f"{name}: {error}" for (name, _), (_, error) in zip(sources, results) if error]
+        if errors:
+            return self.reply(422, ("\n".join(errors) + "\n").encode(), "text/plain")
+
+        try:
+            if url.path == "/convert":
+                data = encode_page(results[0][0], timemult, version, options["depth"])
+            else:
+                data = pack_bytes(((plane, timemult) for plane, _ in results), *options["size"])
+        except ValueError as e:
+            return self.reply(400, f"{e}\n".encode(), "text/plain")
+        self.reply(200, data, "application/octet-stream")
+
+    def reply(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ConvertServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections under a burst of clients
+    request_queue_size = 128
+
+
+class UnixConvertServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def make_server(batcher, defaults, port=DEFAULT_PORT, unix_socket=None, verbose=False):
+    """
+    An HTTP server on 127.0.0.1:``port``, or on the Unix socket path ``unix_socket``.
+
+    Parameters
+    ----------
+    batcher : Batcher
+    defaults : dict
+        threshold, invert, size, policy, dither, depth and version used when a request doesn't set them.
+    """
+    if unix_socket:
+        server = UnixConvertServer(unix_socket, ConvertHandler)
+    else:
+        server = ConvertServer(("127.0.0.1", port), ConvertHandler)
+    server.batcher = batcher
+    server.defaults = defaults
+    server.verbose = verbose
+    return server
+
+
+def serve(port=DEFAULT_PORT, unix_socket=None, threshold=50, invert=False, workers=None, cache_dir=None,
+          version=FORMAT_V3, size=PAGE_SIZE, policy="fit", dither="none", depth=1, verbose=False):
+    """
+    Run the conversion service until interrupted.
+    """
+    batcher = Batcher(workers, cache_dir)
+    defaults = {"threshold": threshold, "invert": invert, "size": tuple(size), "policy": policy, "dither": dither,
+                "depth": depth, "version": version}
+    server = make_server(batcher, defaults, port, unix_socket, verbose)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        batcher.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
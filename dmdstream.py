@@ -0,0 +1,321 @@
+import io
+import os
+import sys
+import queue
+import struct
+import threading
+import multiprocessing
+from collections import deque
+
+from dmdcore import convert, convert_bytes
+from dmdbatch import worker_cache
+import dmdprofile
+
+FRAMINGS = ("concat", "prefixed")
+
+# "prefixed" frames: big-endian byte length, then the image (or page)
+PREFIX = struct.Struct(">I")
+
+# largest image accepted from a stream, so a corrupt length or header can't exhaust memory
+MAX_IMAGE = 64 * 1024 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# JPEG markers without a length field: TEM and RST0~7 (SOI and EOI are handled separately)
+JPEG_BARE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+# queue entry after the last source
+END = None
+
+
+def read_exactly(stream, size) -> bytes:
+    if size > MAX_IMAGE:
+        raise ValueError(f"Image is larger than {MAX_IMAGE} bytes, the stream is probably corrupt")
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError(f"Stream ended {size - len(data)} bytes into an image")
+    return data
+
+
+def read_prefixed(stream):
+    """
+    Yield the images of a stream of length-prefixed frames.
+    """
+    while True:
+        prefix = stream.read(PREFIX.size)
+        if not prefix:
+            return
+        if len(prefix) != PREFIX.size:
+            raise ValueError("Stream ended inside a length prefix")
+        yield read_exactly(stream, PREFIX.unpack(prefix)[0])
+
+
+def read_png(stream, head):
+    parts = [head, read_exactly(stream, len(PNG_SIGNATURE) - len(head))]
+    if b"".join(parts) != PNG_SIGNATURE:
+        raise ValueError("Bad PNG signature")
+    while True:
+        chunk = read_exactly(stream, 8)
+        length, kind = struct.unpack(">I4s", chunk)
+        parts += [chunk, read_exactly(stream, length + 4)]
+        if kind == b"IEND":
+            return b"".join(parts)
+
+
+def read_bmp(stream, head):
+    head += read_exactly(stream, 6 - len(head))
+    size = struct.unpack_from("<I", head, 2)[0]
+    if size < 26:
+        raise ValueError("BMP header has no file size, use prefixed framing")
+    return head + read_exactly(stream, size - len(head))
+
+
+def read_webp(stream, head):
+    head += read_exactly(stream, 12 - len(head))
+    if head[8:12] != b"WEBP":
+        raise ValueError("Only WebP RIFF files are supported")
+    return head + read_exactly(stream, struct.unpack_from("<I", head, 4)[0] + 8 - len(head))
+
+
+def read_sub_blocks(stream, parts):
+    while True:
+        size = read_exactly(stream, 1)
+        parts.append(size)
+        if size == b"\0":
+            return
+        parts.append(read_exactly(stream, size[0]))
+
+
+def read_gif(stream, head):
+    # header and logical screen descriptor
+    header = head + read_exactly(stream, 13 - len(head))
+    parts = [header]
+    if header[10] & 0x80:
+        parts.append(read_exactly(stream, 3 << ((header[10] & 7) + 1)))
+
+    while True:
+        block = read_exactly(stream, 1)
+        parts.append(block)
+        if block == b"\x3b":
+            return b"".join(parts)
+        if block == b"\x21":
+            # extension label
+            parts.append(read_exactly(stream, 1))
+        elif block == b"\x2c":
+            descriptor = read_exactly(stream, 9)
+            parts.append(descriptor)
+            if descriptor[8] & 0x80:
+                parts.append(read_exactly(stream, 3 << ((descriptor[8] & 7) + 1)))
+            # LZW minimum code size
+            parts.append(read_exactly(stream, 1))
+        else:
+            raise ValueError(f"Unexpected GIF block {block[0]:#04x}")
+        read_sub_blocks(stream, parts)
+
+
+def scan_byte(byte) -> bool:
+    """
+    Whether 0xff followed by ``byte`` is part of JPEG scan data (a stuffed zero or a restart marker).
+    """
+    return byte == 0 or 0xD0 <= byte <= 0xD7
+
+
+def read_scan(stream, parts):
+    """
+    Read JPEG scan data into ``parts`` and return the marker that ends it.
+    The data is searched in the stream's buffer rather than a byte at a time.
+    """
+    total = 0
+    while True:
+        buffer = stream.peek(2)
+        if not buffer:
+            raise ValueError("Stream ended inside JPEG scan data")
+        end = buffer.find(b"\xff")
+        while end != -1 and end + 1 < len(buffer) and scan_byte(buffer[end + 1]):
+            end = buffer.find(b"\xff", end + 2)
+
+        if end == -1:
+            end = len(buffer)
+        elif end == 0:
+            # 0xff at the end of what is buffered, the next byte decides
+            pair = read_exactly(stream, 2)
+            if not scan_byte(pair[1]):
+                return pair
+            parts.append(pair)
+            continue
+        elif end + 1 < len(buffer):
+            parts.append(stream.read(end))
+            return read_exactly(stream, 2)
+
+        total += end
+        if total > MAX_IMAGE:
+            raise ValueError(f"Image is larger than {MAX_IMAGE} bytes, the stream is probably corrupt")
+        parts.append(stream.read(end))
+
+
+def read_jpeg(stream, head):
+    parts = [head]
+    marker = read_exactly(stream, 2)
+    while True:
+        if marker[0] != 0xFF:
+            raise ValueError("JPEG marker expected")
+        if marker[1] == 0xFF:
+            # fill byte
+            parts.append(marker[:1])
+            marker = marker[1:] + read_exactly(stream, 1)
+            continue
+        parts.append(marker)
+        if marker[1] == 0xD9:
+            return b"".join(parts)
+        if marker[1] in JPEG_BARE_MARKERS:
+            marker = read_exactly(stream, 2)
+            continue
+
+        length = read_exactly(stream, 2)
+        parts += [length, read_exactly(stream, struct.unpack(">H", length)[0] - 2)]
+        marker = read_scan(stream, parts) if marker[1] == 0xDA else read_exactly(stream, 2)
+
+
+# image readers by the first two bytes of the file
+READERS = {PNG_SIGNATURE[:2]: read_png, b"\xff\xd8": read_jpeg, b"GI": read_gif, b"BM": read_bmp,
+           b"RI": read_webp}
+
+
+def read_concatenated(stream):
+    """
+    Yield the images of a stream of back to back PNG, JPEG, GIF, BMP or WebP
+    files. Each format's own structure gives the image's length, so nothing
+    past the current image is read.
+    """
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    while True:
+        head = stream.read(2)
+        if not head:
+            return
+        if len(head) != 2 or head not in READERS:
+            raise ValueError("Can't tell where this image ends (PNG, JPEG, GIF, BMP and WebP can be concatenated), "
+                             "use prefixed framing")
+        yield READERS[head](stream, head)
+
+
+def stream_job(source, options, cache_dir=None):
+    return convert_bytes(source, cache=worker_cache(cache_dir), **options)
+
+
+def profiled_stream_job(source, options, cache_dir=None):
+    """
+    ``stream_job`` in a pool worker, also handing the worker's stage timings back to the parent.
+    """
+    return stream_job(source, options, cache_dir), dmdprofile.drain()
+
+
+def read_ahead(sources, buffer):
+    """
+    Feed ``sources`` into the bounded queue ``buffer`` from a thread, so the
+    stream is only read while there is room.
+    """
+    try:
+        for source in sources:
+            buffer.put(source)
+    except (OSError, ValueError) as e:
+        buffer.put(e)
+        return
+    buffer.put(END)
+
+
+def convert_sources(sources, options, workers=1, cache_dir=None):
+    """
+    Convert encoded images to DMD pages, yielding each page in order as soon as it is done.
+
+    With more than one worker, up to two images per worker are converting at
+    once and as many more are read ahead. Nothing else is buffered, so a
+    consumer that stops taking pages stops the reading too.
+    """
+    if workers <= 1:
+        for source in sources:
+            yield stream_job(source, options, cache_dir)
+        return
+
+    buffer = queue.Queue(workers)
+    threading.Thread(target=read_ahead, args=(sources, buffer), daemon=True).start()
+    pending = deque()
+    done = False
+    with multiprocessing.Pool(workers, initializer=dmdprofile.reset) as pool:
+        while not done or pending:
+            # only wait for input while nothing is converting, otherwise hand back finished pages first
+            while not done and len(pending) < 2 * workers:
+                try:
+                    source = buffer.get(block=not pending)
+                except queue.Empty:
+                    break
+                if isinstance(source, Exception):
+                    raise source
+                if source is END:
+                    done = True
+                    break
+                pending.append(pool.apply_async(profiled_stream_job, (source, options, cache_dir)))
+            if pending:
+                page, samples = pending.popleft().get()
+                if dmdprofile.enabled:
+                    dmdprofile.merge(samples)
+                yield page
+        # workers left to exit on their own write out their cache entries, terminating them would drop them
+        pool.close()
+        pool.join()
+
+
+def convert_stream(stream_in, stream_out, framing="concat", workers=1, cache_dir=None, **options):
+    """
+    Convert a stream of images into a stream of DMD pages.
+
+    Parameters
+    ----------
+    framing : str
+        "concat" for back to back image files in, back to back pages out
+        (v3 pages carry their size, v2 pages are all 1025 bytes).
+        "prefixed" for frames with a 4 byte big-endian length both ways.
+    options
+        ``convert_bytes`` options: threshold, invert, timemult, version, size, policy, dither.
+
+    Returns
+    -------
+    int
+        Number of pages written.
+    """
+    if framing not in FRAMINGS:
+        raise ValueError(f"Unknown framing {framing}, expected one of {', '.join(FRAMINGS)}")
+    sources = read_prefixed(stream_in) if framing == "prefixed" else read_concatenated(stream_in)
+
+    count = 0
+    for page in convert_sources(sources, options, workers, cache_dir):
+        if framing == "prefixed":
+            stream_out.write(PREFIX.pack(len(page)))
+        stream_out.write(page)
+        stream_out.flush()
+        count += 1
+    return count
+
+
+def convert_path(in_file, output, cache=None, **options):
+    """
+    ``convert`` where "-" reads the image from stdin or writes the page to stdout.
+    """
+    if in_file != "-" and output != "-":
+        return convert(in_file, output, cache=cache, **options)
+
+    if in_file == "-":
+        source = sys.stdin.buffer.read()
+    else:
+        with open(in_file, "rb") as file:
+            source = file.read()
+    data = convert_bytes(source, cache=cache, **options)
+
+    if output == "-":
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else:
+        with open(output + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(output + ".tmp", output)
+    return data
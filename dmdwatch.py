@@ -0,0 +1,286 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from dmdbatch import build_directory, RASTER_EXTENSIONS
+from dmdcore import FORMAT_V3, PAGE_SIZE
+
+# seconds between scans when polling
+POLL_INTERVAL = 2.0
+
+# polls are spaced at least this many scan durations apart, so a large tree costs at most ~2% of a core
+POLL_SPACING = 50
+
+# seconds a file has to stay unchanged before it is converted, so a burst of writes converts once
+SETTLE_TIME = 0.5
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+# struct inotify_event without the trailing name
+EVENT = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def scan_tree(root, extensions=RASTER_EXTENSIONS):
+    """
+    Walk ``root`` for sources.
+
+    Returns
+    -------
+    tuple
+        ({relative source name: (size, mtime_ns)}, [directory paths])
+    """
+    files = {}
+    directories = []
+    stack = [(root, "")]
+    while stack:
+        directory, prefix = stack.pop()
+        directories.append(directory)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, prefix + entry.name + os.sep))
+                        elif entry.name.lower().endswith(extensions) and entry.is_file():
+                            stat = entry.stat()
+                            files[prefix + entry.name] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        # removed while walking
+                        continue
+        except OSError:
+            continue
+    return files, directories
+
+
+def changed_names(before, after) -> set:
+    return {name for name in before.keys() | after.keys() if before.get(name) != after.get(name)}
+
+
+class PollWatcher:
+    """
+    Finds changes by rescanning the tree every ``interval`` seconds, for
+    platforms without inotify and network shares it doesn't see writes on.
+    Trees too large to scan that often are polled less often instead.
+    """
+
+    def __init__(self, root, extensions=RASTER_EXTENSIONS, interval=POLL_INTERVAL):
+        self.root = root
+        self.extensions = extensions
+        self.interval = interval
+        self.delay = interval
+        self.files = self.scan()
+
+    def scan(self):
+        start = time.perf_counter()
+        files, _ = scan_tree(self.root, self.extensions)
+        self.delay = max(self.interval, (time.perf_counter() - start) * POLL_SPACING)
+        return files
+
+    def wait(self, timeout=None) -> set:
+        """
+        Block up to ``timeout`` seconds (or the poll delay, if shorter) and
+        return the names of sources changed since the last call.
+        """
+        time.sleep(self.delay if timeout is None else min(timeout, self.delay))
+        files = self.scan()
+        changed = changed_names(self.files, files)
+        self.files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+def load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    return libc
+
+
+class InotifyWatcher:
+    """
+    Finds changes from inotify events, so an idle tree costs nothing between
+    writes. Directory level events and queue overflows fall back to a
+    rescan, which also picks up watches for new directories.
+    """
+
+    def __init__(self, root, extensions=RASTER_EXTENSIONS, libc=None):
+        self.root = root
+        self.extensions = extensions
+        self.libc = libc or load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        try:
+            self.files = self.rescan()
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, "Out of inotify watches, raise fs.inotify.max_user_watches or use --poll")
+            # removed before the watch was added, the next rescan drops it
+            return
+        self.directories[wd] = directory
+
+    def rescan(self):
+        files, directories = scan_tree(self.root, self.extensions)
+        self.directories.clear()
+        for directory in directories:
+            self.add_watch(directory)
+        return files
+
+    def read_events(self):
+        """
+        Returns
+        -------
+        set or None
+            Changed source names, or None when the tree has to be rescanned.
+        """
+        changed = set()
+        rescan = False
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0"))
+                offset += EVENT.size + length
+
+                if mask & (IN_Q_OVERFLOW | IN_ISDIR):
+                    rescan = True
+                elif wd in self.directories and name.lower().endswith(self.extensions):
+                    changed.add(os.path.relpath(os.path.join(self.directories[wd], name), self.root))
+        return None if rescan else changed
+
+    def wait(self, timeout=None) -> set:
+        """
+        Block until events arrive or ``timeout`` seconds pass, and return the
+        names of sources changed since the last call.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed = self.read_events()
+        if changed is not None:
+            return changed
+
+        files = self.rescan()
+        changed = changed_names(self.files, files)
+        self.files = files
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(root, extensions=RASTER_EXTENSIONS, poll=False, interval=POLL_INTERVAL):
+    """
+    An ``InotifyWatcher`` where the platform has one, otherwise (or with ``poll``) a ``PollWatcher``.
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(root, extensions)
+        except OSError as e:
+            print(f"Falling back to polling every {interval}s: {e.strerror}", file=sys.stderr)
+    return PollWatcher(root, extensions, interval)
+
+
+def output_name(name):
+    return os.path.splitext(name)[0] + ".dmd"
+
+
+def sync(dir_in, dir_out, names, scope, options):
+    """
+    Convert the sources ``names`` of ``dir_in`` that changed since the last
+    build, and remove the outputs of sources in ``scope`` that are gone.
+    """
+    targets = {name: (os.path.join(dir_in, name), output_name(name)) for name in names
+               if os.path.isfile(os.path.join(dir_in, name))}
+    for directory in {os.path.dirname(output) for _, output in targets.values()}:
+        os.makedirs(os.path.join(dir_out, directory), exist_ok=True)
+    yield from build_directory(targets, dir_out, scope=scope, **options)
+
+
+def watch_directory(dir_in, dir_out, threshold=50, invert=False, timemult=1, workers=None, cache_dir=None,
+                    version=FORMAT_V3, size=PAGE_SIZE, policy="fit", dither="none", depth=1,
+                    extensions=RASTER_EXTENSIONS, poll=False, interval=POLL_INTERVAL, settle=SETTLE_TIME):
+    """
+    Bring ``dir_out`` up to date with the source tree ``dir_in``, then keep it
+    that way as sources are added, changed and removed.
+
+    Changes are debounced: a source is converted once it has been left alone
+    for ``settle`` seconds, and everything that settled together is converted
+    as one incremental ``build_directory`` run, so only changed sources are
+    converted and outputs are replaced atomically by ``convert``.
+
+    Parameters
+    ----------
+    poll : bool
+        Poll every ``interval`` seconds even where inotify is available.
+
+    Yields
+    ------
+    tuple
+        (action, name, error) as ``build_directory``, until interrupted.
+    """
+    options = dict(threshold=threshold, invert=invert, timemult=timemult, workers=workers, cache_dir=cache_dir,
+                   version=version, size=size, policy=policy, dither=dither, depth=depth)
+
+    # watch before the first build so nothing written during it is missed
+    watcher = open_watcher(dir_in, extensions, poll, interval)
+    try:
+        # sources of other extensions may belong to another build sharing dir_out
+        yield from sync(dir_in, dir_out, watcher.files, lambda name: name.lower().endswith(extensions), options)
+
+        pending = {}
+        while True:
+            timeout = max(0.0, min(pending.values()) + settle - time.monotonic()) if pending else None
+            changed = watcher.wait(timeout)
+            now = time.monotonic()
+            for name in changed:
+                pending[name] = now
+
+            ready = {name for name, last in pending.items() if now - last >= settle}
+            if ready:
+                for name in ready:
+                    del pending[name]
+                yield from sync(dir_in, dir_out, ready, ready.__contains__, options)
+    finally:
+        watcher.close()
@@ -0,0 +1,1219 @@
+import json
+import os
+import sys
+import platform
+from collections import OrderedDict
+
+from PIL import Image, ImageColor
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+import qt_material
+import qtawesome as qta
+
+from dmdcore import (remove_transparency, rgb_array, intensity_plane, plane_intensity, threshold_lut, level_lut,
+                     encode_page, plane_to_image, resize_image, PAGE_WIDTH, PAGE_HEIGHT, PAGE_SIZE, RESIZE_POLICIES,
+                     DITHER_MODES, MAX_DEPTH, FORMAT_V2, FORMAT_V3)
+from dmddither import dither_plane
+from dmdformat import PageFile
+from dmdpreview import render_led_grid, PREVIEW_SIZE
+from dmdpack import PackReader, PACK_EXTENSION, build_pack, extract_pack, page_sources
+from dmdprofile import stage
+from dmdplayback import PageSequence, page_starts, page_at, DEFAULT_BASE_MS
+from dmdsearch import SearchIndex
+
+if platform.system() == "Windows" and platform.release() == "10":
+    from pyqt_windows_os_light_dark_theme_window.main import Window
+else:
+    Window = QWidget
+
+MAX_FILE_PREVIEW_LEN = 40
+
+THUMBNAIL_SIZE = 128
+THUMBNAIL_CACHE_SIZE = 512
+# most search results shown in the example picker, the rest are left to a narrower search
+SEARCH_LIMIT = 500
+
+PLAYBACK_FPS = 60
+# rendered playback frames kept, and how many of them are rendered ahead of the playhead
+FRAME_CACHE_SIZE = 240
+FRAME_PREFETCH = 120
+
+preview_colors = {"Red": (255, 20, 20),
+                  "Green": (20, 255, 20),
+                  "Yellow": (255, 255, 30),
+                  "Blue": (20, 20, 255),
+                  "White": (250, 250, 250)}
+
+# set up by run(), only the GUI needs the example gallery
+example_files = {}
+example_index = None
+thumbnails = None
+secondary_color = None
+
+
+def str_trunc(string: str, nchars: int):
+    return (string[:nchars - 1] + "…")[:min(len(string), nchars)]
+
+
+class MainWindow(Window):
+    # noinspection PyArgumentList
+    def __init__(self, args):
+        super(MainWindow, self).__init__()
+        self.setWindowTitle("DMD Page Builder")
+        self.setWindowIcon(QIcon("icon.svg"))
+
+        self.file = ""
+
+        self.threshold = args.threshold
+        self.invert = False
+        self.timemult = 1
+
+        self.example_picker = None
+
+        self.render_pool = QThreadPool(self)
+        self.render_pool.setMaxThreadCount(1)
+        self.render_generation = 0
+        self.render_task = None
+        self.render_pending = False
+
+        self.layout = QVBoxLayout()
+        self.layout.setContentsMargins(2, 2, 2, 2)
+        self.setLayout(self.layout)
+
+        self.widget = QTabWidget()
+        self.layout.addWidget(self.widget)
+
+        self.load_widget = QWidget()
+        self.load_root_layout = QHBoxLayout()
+        self.load_layout = QVBoxLayout()
+        self.load_root_layout.addLayout(self.load_layout)
+        self.load_widget.setLayout(self.load_root_layout)
+        self.widget.addTab(self.load_widget, "Load")
+
+        self.edit_widget = QWidget()
+        self.edit_layout = QVBoxLayout()
+        self.edit_widget.setLayout(self.edit_layout)
+        self.widget.addTab(self.edit_widget, "Edit")
+
+        self.preview_widget = QWidget()
+        self.preview_layout = QVBoxLayout()
+        self.preview_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.preview_widget.setLayout(self.preview_layout)
+        self.widget.addTab(self.preview_widget, "Preview")
+
+        self.pack_widget = QWidget()
+        self.pack_layout = QVBoxLayout()
+        self.pack_widget.setLayout(self.pack_layout)
+        self.widget.addTab(self.pack_widget, "Pack")
+
+        self.playback_widget = QWidget()
+        self.playback_layout = QVBoxLayout()
+        self.playback_widget.setLayout(self.playback_layout)
+        self.widget.addTab(self.playback_widget, "Playback")
+
+        self.about_widget = QWidget()
+        self.about_layout = QVBoxLayout()
+        self.about_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.about_widget.setLayout(self.about_layout)
+        self.widget.addTab(self.about_widget, "About")
+
+        self.file_layout = QHBoxLayout()
+        self.load_layout.addLayout(self.file_layout)
+
+        self.file_button = QPushButton("Pick File")
+        self.file_button.setIcon(qta.icon("mdi.upload", color=secondary_color))
+        self.file_button.setIconSize(QSize(32, 32))
+        self.file_button.clicked.connect(lambda: self.load_source())  # lambda required to run dialog
+        self.file_layout.addWidget(self.file_button)
+
+        self.file_button = QPushButton("Pick an Example")
+        self.file_button.setIcon(qta.icon("mdi.image", color=secondary_color))
+        self.file_button.setIconSize(QSize(32, 32))
+        self.file_button.clicked.connect(self.load_example)
+        self.file_layout.addWidget(self.file_button)
+
+        self.save_quick_button = QPushButton("Quick Export")
+        self.save_quick_button.setIcon(qta.icon("mdi.micro-sd", color=secondary_color))
+        self.save_quick_button.setIconSize(QSize(32, 32))
+        self.save_quick_button.clicked.connect(self.save_dmd)
+        self.load_layout.addWidget(self.save_quick_button)
+
+        self.file_text = QLabel(str_trunc("No file selected", MAX_FILE_PREVIEW_LEN))
+        self.load_layout.addWidget(self.file_text)
+
+        self.load_layout.addStretch()
+
+        self.source_preview = QLabel()
+        self.source_preview.setPixmap(QPixmap("error.png").scaled(256, 256))
+        self.source_preview.setFixedSize(QSize(256, 256))
+        self.source_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.load_layout.addWidget(self.source_preview, alignment=Qt.AlignmentFlag.AlignCenter)
+
+        self.load_layout.addStretch()
+
+        self.edit_top_layout = QGridLayout()
+        self.edit_layout.addLayout(self.edit_top_layout)
+
+        self.edit_layout.addStretch()
+
+        self.source_label = QLabel("Source")
+        self.edit_top_layout.addWidget(self.source_label, 0, 0)
+
+        self.out_label = QLabel("Output")
+        self.edit_top_layout.addWidget(self.out_label, 0, 1)
+
+        self.source_preview_2 = QLabel()
+        self.source_preview_2.setPixmap(QPixmap("error.png").scaled(128, 128))
+        self.source_preview_2.setFixedSize(QSize(128, 128))
+        self.source_preview_2.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.edit_top_layout.addWidget(self.source_preview_2, 1, 0)
+
+        self.output_preview = QLabel()
+        self.output_preview.setPixmap(QPixmap("error.png").scaled(128, 128))
+        self.output_preview.setFixedSize(QSize(128, 128))
+        self.output_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.edit_top_layout.addWidget(self.output_preview, 1, 1)
+
+        self.invert_check = QCheckBox("Invert")
+        self.invert_check.setChecked(self.invert)
+        self.invert_check.toggled.connect(self.create_image)
+        self.edit_layout.addWidget(self.invert_check)
+
+        self.resize_layout = QHBoxLayout()
+        self.edit_layout.addLayout(self.resize_layout)
+
+        self.resize_label = QLabel("Resize")
+        self.resize_layout.addWidget(self.resize_label)
+
+        self.resize_combo = QComboBox()
+        self.resize_combo.addItems([policy.capitalize() for policy in RESIZE_POLICIES])
+        self.resize_combo.setCurrentIndex(RESIZE_POLICIES.index(args.resize))
+        self.resize_combo.currentIndexChanged.connect(self.on_resize_policy)
+        self.resize_layout.addWidget(self.resize_combo)
+
+        self.dither_layout = QHBoxLayout()
+        self.edit_layout.addLayout(self.dither_layout)
+
+        self.dither_label = QLabel("Dither")
+        self.dither_layout.addWidget(self.dither_label)
+
+        self.dither_combo = QComboBox()
+        self.dither_combo.addItems([mode.replace("-", " ").title() for mode in DITHER_MODES])
+        self.dither_combo.setCurrentIndex(DITHER_MODES.index(args.dither))
+        self.dither_combo.currentIndexChanged.connect(self.create_image)
+        self.dither_layout.addWidget(self.dither_combo)
+
+        self.levels_layout = QHBoxLayout()
+        self.edit_layout.addLayout(self.levels_layout)
+
+        self.levels_label = QLabel("Levels")
+        self.levels_layout.addWidget(self.levels_label)
+
+        self.levels_combo = QComboBox()
+        self.levels_combo.addItems([str(2 ** depth) for depth in range(1, MAX_DEPTH + 1)])
+        self.levels_combo.setCurrentIndex(args.depth - 1)
+        self.levels_combo.currentIndexChanged.connect(self.create_image)
+        self.levels_layout.addWidget(self.levels_combo)
+
+        self.threshold_layout = QHBoxLayout()
+        self.edit_layout.addLayout(self.threshold_layout)
+
+        self.threshold_label = QLabel("Threshold")
+        self.threshold_layout.addWidget(self.threshold_label)
+
+        self.threshold_slider = QSlider(Qt.Orientation.Horizontal)
+        self.threshold_slider.setRange(-1, 255)
+        self.threshold_slider.setValue(self.threshold)
+        self.threshold_slider.valueChanged.connect(self.create_image)
+        self.threshold_layout.addWidget(self.threshold_slider)
+
+        self.multiplier_layout = QHBoxLayout()
+        self.edit_layout.addLayout(self.multiplier_layout)
+
+        self.multiplier_label = QLabel("Page Time Multiplier")
+        self.multiplier_layout.addWidget(self.multiplier_label)
+
+        self.multiplier_spin = QSpinBox()
+        self.multiplier_spin.setValue(self.timemult)
+        self.multiplier_spin.setRange(1, 20)
+        self.multiplier_spin.valueChanged.connect(self.on_mult_spin)
+        self.multiplier_layout.addWidget(self.multiplier_spin)
+
+        self.legacy_check = QCheckBox("Legacy Format (DMD v2)")
+        self.legacy_check.setChecked(args.legacy)
+        self.edit_layout.addWidget(self.legacy_check)
+
+        self.bottom_layout = QHBoxLayout()
+        self.edit_layout.addLayout(self.bottom_layout)
+
+        self.save_pc_button = QPushButton("Save for PC")
+        self.save_pc_button.setIcon(qta.icon("mdi.content-save", color=secondary_color))
+        self.save_pc_button.setIconSize(QSize(32, 32))
+        self.save_pc_button.clicked.connect(self.save_pc)
+        self.bottom_layout.addWidget(self.save_pc_button)
+
+        self.save_dmd_button = QPushButton("Save for DMD")
+        self.save_dmd_button.setIcon(qta.icon("mdi.micro-sd", color=secondary_color))
+        self.save_dmd_button.setIconSize(QSize(32, 32))
+        self.save_dmd_button.clicked.connect(self.save_dmd)
+        self.bottom_layout.addWidget(self.save_dmd_button)
+
+        self.preview_top_layout = QHBoxLayout()
+        self.preview_layout.addLayout(self.preview_top_layout)
+
+        self.preview_color = QComboBox()
+        self.preview_color.addItems(["Red", "Green", "Yellow", "Blue", "White"])
+        self.preview_color.currentIndexChanged.connect(self.create_image)
+        self.preview_top_layout.addWidget(self.preview_color)
+
+        self.preview = QLabel()
+        self.preview_layout.addWidget(self.preview)
+
+        self.pack = None
+
+        self.pack_top_layout = QHBoxLayout()
+        self.pack_layout.addLayout(self.pack_top_layout)
+
+        self.pack_open_button = QPushButton("Open Pack")
+        self.pack_open_button.setIcon(qta.icon("mdi.folder-open", color=secondary_color))
+        self.pack_open_button.setIconSize(QSize(32, 32))
+        self.pack_open_button.clicked.connect(self.open_pack)
+        self.pack_top_layout.addWidget(self.pack_open_button)
+
+        self.pack_build_button = QPushButton("Build Pack")
+        self.pack_build_button.setIcon(qta.icon("mdi.package-variant-closed", color=secondary_color))
+        self.pack_build_button.setIconSize(QSize(32, 32))
+        self.pack_build_button.clicked.connect(self.build_pack)
+        self.pack_top_layout.addWidget(self.pack_build_button)
+
+        self.pack_extract_button = QPushButton("Extract Pack")
+        self.pack_extract_button.setIcon(qta.icon("mdi.package-variant", color=secondary_color))
+        self.pack_extract_button.setIconSize(QSize(32, 32))
+        self.pack_extract_button.clicked.connect(self.extract_pack)
+        self.pack_extract_button.setEnabled(False)
+        self.pack_top_layout.addWidget(self.pack_extract_button)
+
+        self.pack_text = QLabel(str_trunc("No pack open", MAX_FILE_PREVIEW_LEN))
+        self.pack_layout.addWidget(self.pack_text)
+
+        self.pack_pages = QListWidget()
+        self.pack_pages.currentRowChanged.connect(self.open_pack_page)
+        self.pack_layout.addWidget(self.pack_pages)
+
+        self.sequence = None
+        self.play_starts = None
+        self.play_page = 0
+        self.play_shown = -1
+        self.play_origin = 0.0
+        self.play_dropped = 0
+        self.play_ticks = 0
+        self.play_fps = 0.0
+        self.play_clock = QElapsedTimer()
+        self.fps_clock = QElapsedTimer()
+
+        self.play_timer = QTimer(self)
+        self.play_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.play_timer.setInterval(1000 // PLAYBACK_FPS)
+        self.play_timer.timeout.connect(self.on_play_tick)
+
+        self.frames = FrameCache()
+        self.frames.ready.connect(self.on_frame_ready)
+
+        self.playback_top_layout = QHBoxLayout()
+        self.playback_layout.addLayout(self.playback_top_layout)
+
+        self.play_folder_button = QPushButton("Open Folder")
+        self.play_folder_button.setIcon(qta.icon("mdi.folder-open", color=secondary_color))
+        self.play_folder_button.setIconSize(QSize(32, 32))
+        self.play_folder_button.clicked.connect(lambda: self.open_playback(folder=True))
+        self.playback_top_layout.addWidget(self.play_folder_button)
+
+        self.play_pack_button = QPushButton("Open Pack")
+        self.play_pack_button.setIcon(qta.icon("mdi.package-variant", color=secondary_color))
+        self.play_pack_button.setIconSize(QSize(32, 32))
+        self.play_pack_button.clicked.connect(lambda: self.open_playback(folder=False))
+        self.playback_top_layout.addWidget(self.play_pack_button)
+
+        self.play_text = QLabel(str_trunc("Nothing to play", MAX_FILE_PREVIEW_LEN))
+        self.playback_layout.addWidget(self.play_text)
+
+        self.play_view = QLabel()
+        self.play_view.setFixedSize(QSize(PREVIEW_SIZE, PREVIEW_SIZE))
+        self.play_view.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.playback_layout.addWidget(self.play_view, alignment=Qt.AlignmentFlag.AlignCenter)
+
+        self.play_slider = QSlider(Qt.Orientation.Horizontal)
+        self.play_slider.setRange(0, 0)
+        self.play_slider.valueChanged.connect(self.on_play_slider)
+        self.playback_layout.addWidget(self.play_slider)
+
+        self.playback_bottom_layout = QHBoxLayout()
+        self.playback_layout.addLayout(self.playback_bottom_layout)
+
+        self.play_button = QPushButton("Play")
+        self.play_button.setIcon(qta.icon("mdi.play", color=secondary_color))
+        self.play_button.setIconSize(QSize(32, 32))
+        self.play_button.clicked.connect(self.toggle_playback)
+        self.play_button.setEnabled(False)
+        self.playback_bottom_layout.addWidget(self.play_button)
+
+        self.loop_check = QCheckBox("Loop")
+        self.playback_bottom_layout.addWidget(self.loop_check)
+
+        self.step_label = QLabel("Time Step")
+        self.playback_bottom_layout.addWidget(self.step_label)
+
+        # duration of a page time multiplier of 1, as dmdimport --base-ms
+        self.step_spin = QSpinBox()
+        self.step_spin.setRange(1, 1000)
+        self.step_spin.setSuffix(" ms")
+        self.step_spin.setValue(DEFAULT_BASE_MS)
+        self.step_spin.valueChanged.connect(self.on_step_spin)
+        self.playback_bottom_layout.addWidget(self.step_spin)
+
+        self.play_status = QLabel()
+        self.playback_layout.addWidget(self.play_status)
+
+        self.preview_color.currentIndexChanged.connect(self.on_playback_colour)
+
+        self.about_icon = QLabel()
+        self.about_icon.setPixmap(QPixmap("icon-large.svg").scaled(192, 192,
+                                  transformMode=Qt.TransformationMode.SmoothTransformation))
+        self.about_layout.addWidget(self.about_icon)
+
+        self.about_title = QLabel("DMD PageBuilder")
+        self.about_title.setObjectName("H1")
+        self.about_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.about_layout.addWidget(self.about_title)
+
+        self.about_version = QLabel(QApplication.applicationVersion())
+        self.about_version.setObjectName("H2")
+        self.about_version.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.about_layout.addWidget(self.about_version)
+
+        self.about_author = QLabel(f"By: {QApplication.organizationName()}")
+        self.about_author.setObjectName("H2")
+        self.about_author.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.about_layout.addWidget(self.about_author)
+
+        self.im = Image.open("error.png")
+        self.decode_source()
+
+        if os.path.isfile(args.input):
+            self.file = args.input
+            self.load_source(False)
+        else:
+            self.file = ""
+
+        self.create_image()
+        self.show()
+
+    def load_source(self, dialog=True):
+        print(dialog)
+        if dialog:
+            dialog = QFileDialog(self)
+            dialog.setNameFilter("Supported Images (*.png *.jpg *.bmp *.dib *.jpg "
+                                 "*.jpeg *.jpe *.jfif *.tiff *.tif *.webp *.dmd)\n"
+                                 "Raster Images (*.png *.jpg *.bmp *.dib *.jpg "
+                                 "*.jpeg *.jpe *.jfif *.tiff *.tif *.webp)\nDMD Images (*.dmd)")
+            out = dialog.exec()
+        else:
+            out = True
+        if out:
+            if dialog:
+                self.file = dialog.selectedFiles()[0]
+
+            if self.file.endswith(".dmd"):
+                try:
+                    page_file = PageFile(self.file)
+                except (OSError, ValueError) as e:
+                    self.show_error("Image Error", str(e))
+                    return
+                # the map is closed as soon as the page is decoded, an open mapping keeps
+                # Windows from overwriting the file (as saving over the page does)
+                with page_file:
+                    if (page_file.width, page_file.height) != PAGE_SIZE:
+                        self.show_error("Image Error", f"Page is {page_file.width}x{page_file.height}, "
+                                                       f"the editor works on {PAGE_WIDTH}x{PAGE_HEIGHT} pages")
+                        return
+                    plane = page_file.plane()
+
+                if page_file.timemult is not None:
+                    self.timemult = page_file.timemult
+                    self.multiplier_spin.setValue(self.timemult)
+
+                self.im = plane_to_image(plane, page_file.depth)
+                self.intensity = plane_intensity(plane, page_file.depth)
+                # create_image runs below with the intensity of this page
+                self.levels_combo.blockSignals(True)
+                self.levels_combo.setCurrentIndex(page_file.depth - 1)
+                self.levels_combo.blockSignals(False)
+
+                self.file_text.setText(str_trunc(self.file, MAX_FILE_PREVIEW_LEN))
+                preview_im = self.im
+                preview_im = remove_transparency(preview_im, (0, 0, 0))
+                preview_im = preview_im.convert("RGB")
+                data = preview_im.tobytes("raw", "RGB")
+                qi = QImage(data, preview_im.size[0], preview_im.size[1], preview_im.size[0] * 3,
+                            QImage.Format.Format_RGB888)
+                preview_pixmap = QPixmap(qi)
+                self.source_preview.setPixmap(preview_pixmap.scaled(256, 256))
+                self.source_preview_2.setPixmap(preview_pixmap.scaled(128, 128))
+
+                self.create_image()
+            else:
+                try:
+                    self.im = resize_image(Image.open(self.file), PAGE_SIZE, self.resize_policy())
+                except (OSError, ValueError) as e:
+                    self.show_error("Image Error", str(e))
+                    return
+
+                self.decode_source()
+                self.file_text.setText(str_trunc(self.file, MAX_FILE_PREVIEW_LEN))
+                preview_im = self.im
+                preview_im = remove_transparency(preview_im, (0, 0, 0))
+                preview_im = preview_im.convert("RGB")
+                data = preview_im.tobytes("raw", "RGB")
+                qi = QImage(data, preview_im.size[0], preview_im.size[1], preview_im.size[0] * 3,
+                            QImage.Format.Format_RGB888)
+                preview_pixmap = QPixmap(qi)
+                self.source_preview.setPixmap(preview_pixmap.scaled(256, 256))
+                self.source_preview_2.setPixmap(preview_pixmap.scaled(128, 128))
+
+                self.create_image()
+
+    def resize_policy(self):
+        return RESIZE_POLICIES[self.resize_combo.currentIndex()]
+
+    def dither_mode(self):
+        return DITHER_MODES[self.dither_combo.currentIndex()]
+
+    def page_depth(self):
+        return self.levels_combo.currentIndex() + 1
+
+    def on_resize_policy(self):
+        # re-read the source so the new policy works from the full size image
+        if self.file and not self.file.endswith(".dmd") and os.path.isfile(self.file):
+            self.load_source(False)
+
+    def open_example(self, file, name):
+        self.im = resize_image(Image.open(file), PAGE_SIZE, self.resize_policy())
+        self.decode_source()
+
+        self.file_text.setText(str_trunc(f"Example, {name}", MAX_FILE_PREVIEW_LEN))
+        preview_im = self.im
+        preview_im = remove_transparency(preview_im, (0, 0, 0))
+        preview_im = preview_im.convert("RGB")
+        data = preview_im.tobytes("raw", "RGB")
+        qi = QImage(data, preview_im.size[0], preview_im.size[1], preview_im.size[0] * 3,
+                    QImage.Format.Format_RGB888)
+        preview_pixmap = QPixmap(qi)
+        self.source_preview.setPixmap(preview_pixmap.scaled(256, 256))
+        self.source_preview_2.setPixmap(preview_pixmap.scaled(128, 128))
+
+    def load_example(self):
+        self.example_picker = ExamplePicker(self)
+        self.example_picker.exec()
+
+        if self.example_picker.item:
+            self.file = example_files[self.example_picker.item]
+            self.open_example(self.file, self.example_picker.item)
+            self.create_image()
+
+    def decode_source(self):
+        """
+        Decode the loaded source once into an intensity plane, so threshold and
+        invert changes only need a lookup table.
+        """
+        with stage("preview.decode"):
+            self.intensity = intensity_plane(rgb_array(self.im))
+
+    def create_image(self):
+        self.invert = self.invert_check.isChecked()
+        self.threshold = self.threshold_slider.value()
+
+        if self.invert:
+            threshold = 255 - self.threshold
+        else:
+            threshold = self.threshold
+
+        dither = self.dither_mode()
+        self.depth = self.page_depth()
+        # dithering makes 1 bit pages
+        self.dither_combo.setEnabled(self.depth == 1)
+        with stage("preview.threshold"):
+            if self.depth > 1:
+                self.plane = level_lut(threshold, self.invert, self.depth)[self.intensity]
+            elif dither == "none":
+                self.plane = threshold_lut(threshold, self.invert)[self.intensity]
+            else:
+                self.plane = dither_plane(self.intensity, threshold, self.invert, dither)
+        self.request_render()
+
+    def request_render(self):
+        """
+        Queue a preview render of the current plane. Bursts of changes while a
+        render is running coalesce into one render of the latest state.
+        """
+        self.render_generation += 1
+        if self.render_task:
+            self.render_pending = True
+        else:
+            self.start_render()
+
+    def start_render(self):
+        self.render_pending = False
+        bcolor = ImageColor.getcolor(os.environ["QTMATERIAL_SECONDARYDARKCOLOR"], "RGB")
+        self.render_task = RenderTask(self.render_generation, self.plane,
+                                      preview_colors[self.preview_color.currentText()], bcolor, self.depth)
+        self.render_task.signals.finished.connect(self.on_render_finished)
+        self.render_pool.start(self.render_task)
+
+    def on_render_finished(self, generation, output_qi, preview_qi):
+        self.render_task = None
+        if generation == self.render_generation and not output_qi.isNull():
+            self.output_preview.setPixmap(QPixmap(output_qi).scaled(128, 128))
+            self.preview.setPixmap(QPixmap(preview_qi))
+
+        if self.render_pending:
+            self.start_render()
+
+    def save_pc(self):
+        dialog = QFileDialog(self)
+        out = dialog.getSaveFileName(filter="Bitmap Image (*.bmp)", parent=self)
+        if out[0]:
+            try:
+                plane_to_image(self.plane, self.depth).save(out[0])
+            except (OSError, ValueError) as e:
+                self.show_error("Save Error", str(e))
+
+    def save_dmd(self):
+        if self.legacy_check.isChecked() and self.depth > 1:
+            self.show_error("Save Error", "DMD v2 pages are 1 bit, set Levels to 2 or save a v3 page")
+            return
+        dialog = QFileDialog(self)
+        out = dialog.getSaveFileName(filter="DMD Image (*.dmd)", parent=self)
+        if out[0]:
+            try:
+                with open(out[0], "wb") as file:
+                    file.write(encode_page(self.plane, self.timemult,
+                                           FORMAT_V2 if self.legacy_check.isChecked() else FORMAT_V3, self.depth))
+            except (OSError, ValueError) as e:
+                self.show_error("Save Error", str(e))
+
+    def on_mult_spin(self):
+        self.timemult = self.multiplier_spin.value()
+
+    def show_error(self, title, text):
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Warning)
+        msg.setText(text)
+        msg.setWindowTitle(title)
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.exec_()
+
+    def open_pack(self, path=None):
+        if not path:
+            path = QFileDialog.getOpenFileName(self, filter=f"DMD Pack (*{PACK_EXTENSION})")[0]
+            if not path:
+                return
+
+        try:
+            pack = PackReader(path)
+        except (OSError, ValueError) as e:
+            self.show_error("Pack Error", str(e))
+            return
+        if (pack.width, pack.height) != PAGE_SIZE:
+            pack.close()
+            self.show_error("Pack Error", f"Pack pages are {pack.width}x{pack.height}, "
+                                          f"the editor works on {PAGE_WIDTH}x{PAGE_HEIGHT} pages")
+            return
+
+        if self.pack:
+            self.pack.close()
+        self.pack = pack
+        self.pack_text.setText(str_trunc(f"{path}, {len(pack)} pages", MAX_FILE_PREVIEW_LEN))
+        self.pack_extract_button.setEnabled(True)
+
+        self.pack_pages.clear()
+        self.pack_pages.addItems([f"Page {n}  (x{timemult})" for n, timemult in enumerate(pack.index["timemult"])])
+        if len(pack):
+            self.pack_pages.setCurrentRow(0)
+
+    def open_pack_page(self, row):
+        if not self.pack or row < 0:
+            return
+
+        plane, self.timemult = self.pack.page(row)
+        self.multiplier_spin.setValue(self.timemult)
+        self.im = plane_to_image(plane)
+        self.intensity = plane_intensity(plane)
+
+        self.file_text.setText(str_trunc(f"Pack, page {row}", MAX_FILE_PREVIEW_LEN))
+        data = self.im.tobytes("raw", "RGB")
+        preview_pixmap = QPixmap(QImage(data, self.im.size[0], self.im.size[1], self.im.size[0] * 3,
+                                        QImage.Format.Format_RGB888))
+        self.source_preview.setPixmap(preview_pixmap.scaled(256, 256))
+        self.source_preview_2.setPixmap(preview_pixmap.scaled(128, 128))
+
+        self.create_image()
+
+    def build_pack(self):
+        directory = QFileDialog.getExistingDirectory(self, "Page Folder")
+        if not directory:
+            return
+        path = QFileDialog.getSaveFileName(filter=f"DMD Pack (*{PACK_EXTENSION})", parent=self)[0]
+        if not path:
+            return
+
+        threshold = 255 - self.threshold if self.invert else self.threshold
+        try:
+            build_pack(path, page_sources(directory), threshold, self.invert)
+        except (OSError, ValueError) as e:
+            self.show_error("Pack Error", str(e))
+            return
+        self.open_pack(path)
+
+    def extract_pack(self):
+        directory = QFileDialog.getExistingDirectory(self, "Extract To")
+        if directory:
+            extract_pack(self.pack.path, directory, FORMAT_V2 if self.legacy_check.isChecked() else FORMAT_V3)
+
+    def open_playback(self, folder=False):
+        if folder:
+            path = QFileDialog.getExistingDirectory(self, "Page Folder")
+        else:
+            path = QFileDialog.getOpenFileName(self, filter=f"DMD Pack (*{PACK_EXTENSION})")[0]
+        if path:
+            self.load_playback(path)
+
+    def load_playback(self, path):
+        threshold = 255 - self.threshold if self.invert else self.threshold
+        try:
+            sequence = PageSequence(path, threshold, self.invert)
+        except (OSError, ValueError) as e:
+            self.show_error("Playback Error", str(e))
+            return
+        if not len(sequence):
+            sequence.close()
+            self.show_error("Playback Error", f"{path} has no pages")
+            return
+
+        self.pause_playback()
+        previous = self.sequence
+        self.sequence = sequence
+        self.reset_frames()
+        if previous:
+            previous.close()
+
+        self.play_starts = page_starts(sequence.timemults, self.step_spin.value())
+        self.play_text.setText(str_trunc(f"{path}, {len(sequence)} pages", MAX_FILE_PREVIEW_LEN))
+        self.play_button.setEnabled(True)
+        self.play_dropped = 0
+        self.play_fps = 0.0
+        self.play_slider.blockSignals(True)
+        self.play_slider.setRange(0, len(sequence) - 1)
+        self.play_slider.blockSignals(False)
+        self.seek_playback(0)
+
+    def reset_frames(self):
+        bcolor = ImageColor.getcolor(os.environ["QTMATERIAL_SECONDARYDARKCOLOR"], "RGB")
+        self.frames.reset(self.sequence, preview_colors[self.preview_color.currentText()], bcolor)
+        self.play_shown = -1
+
+    def on_playback_colour(self):
+        if self.sequence:
+            self.reset_frames()
+            self.show_playback_frame(self.play_page)
+
+    def seek_playback(self, page):
+        self.frames.skip_queued()
+        self.play_page = page
+        self.play_origin = self.play_starts[page]
+        self.play_clock.start()
+        self.show_playback_frame(page)
+
+    def on_play_slider(self, value):
+        if self.sequence and value != self.play_page:
+            self.seek_playback(value)
+
+    def on_step_spin(self):
+        if self.sequence:
+            self.play_starts = page_starts(self.sequence.timemults, self.step_spin.value())
+            self.play_origin = self.play_starts[self.play_page]
+            self.play_clock.start()
+
+    def show_playback_frame(self, page) -> bool:
+        """
+        Show the frame of ``page`` if it is rendered and queue the frames after it.
+
+        Returns
+        -------
+        bool
+            Whether the frame was ready in time.
+        """
+        self.frames.prefetch(page, self.loop_check.isChecked())
+        pixmap = self.frames.get(page)
+        if pixmap is not None:
+            self.play_view.setPixmap(pixmap)
+            self.play_shown = page
+
+        self.play_slider.blockSignals(True)
+        self.play_slider.setValue(page)
+        self.play_slider.blockSignals(False)
+        self.update_play_status()
+        return pixmap is not None
+
+    def on_frame_ready(self, page):
+        # a late frame still goes up while its page is current, it already counts as dropped
+        if page == self.play_page and self.play_shown != page:
+            self.play_view.setPixmap(self.frames.get(page))
+            self.play_shown = page
+
+    def toggle_playback(self):
+        if self.play_timer.isActive():
+            self.pause_playback()
+            return
+
+        if self.play_page == len(self.sequence) - 1 and not self.loop_check.isChecked():
+            self.seek_playback(0)
+        self.play_origin = self.play_starts[self.play_page]
+        self.play_clock.start()
+        self.fps_clock.start()
+        self.play_ticks = 0
+        self.play_dropped = 0
+        self.play_timer.start()
+        self.play_button.setText("Pause")
+        self.play_button.setIcon(qta.icon("mdi.pause", color=secondary_color))
+
+    def pause_playback(self):
+        self.play_timer.stop()
+        self.play_button.setText("Play")
+        self.play_button.setIcon(qta.icon("mdi.play", color=secondary_color))
+
+    def on_play_tick(self):
+        seconds = self.play_origin + self.play_clock.nsecsElapsed() / 1e9
+        total = self.play_starts[-1]
+        if seconds >= total:
+            if not self.loop_check.isChecked():
+                self.pause_playback()
+                return
+            seconds %= total
+            self.play_origin = seconds
+            self.play_clock.start()
+
+        self.play_ticks += 1
+        if self.fps_clock.elapsed() >= 1000:
+            self.play_fps = self.play_ticks * 1000 / self.fps_clock.restart()
+            self.play_ticks = 0
+            self.update_play_status()
+
+        page = page_at(self.play_starts, seconds)
+        if page == self.play_page:
+            return
+        # pages that started and ended between two ticks never reached the screen
+        self.play_dropped += (page - self.play_page - 1) % len(self.sequence)
+        self.play_page = page
+        if not self.show_playback_frame(page):
+            self.play_dropped += 1
+
+    def update_play_status(self):
+        self.play_status.setText(f"Page {self.play_page + 1}/{len(self.sequence)}, "
+                                 f"{self.play_fps:.0f} fps, {self.play_dropped} dropped")
+
+
+class FrameSignals(QObject):
+    finished = pyqtSignal(int, int, QImage)
+
+
+class FrameTask(QRunnable):
+    """
+    Renders the LED grid of one playback page off the GUI thread.
+    """
+
+    def __init__(self, generation, sequence, page, on_colour, border_colour):
+        super().__init__()
+        self.generation = generation
+        self.sequence = sequence
+        self.page = page
+        self.on_colour = on_colour
+        self.border_colour = border_colour
+        self.signals = FrameSignals()
+
+    def run(self):
+        # a page that can't be read or rendered (such as one of another size) plays as a blank frame,
+        # an exception escaping a QRunnable would abort PyQt
+        try:
+            with stage("playback.render"):
+                plane, depth = self.sequence.page(self.page)
+                data = render_led_grid(plane, self.on_colour, self.border_colour, depth=depth).tobytes()
+                image = QImage(data, PREVIEW_SIZE, PREVIEW_SIZE, PREVIEW_SIZE * 3,
+                               QImage.Format.Format_RGB888).copy()
+        except Exception:
+            image = QImage()
+        self.signals.finished.emit(self.generation, self.page, image)
+
+
+class FrameCache(QObject):
+    """
+    A bounded cache of rendered playback frames, filled in the background
+    ahead of the playhead. ``get`` returns None for a frame that isn't
+    rendered yet. When full, the frame whose turn comes last in play order
+    is dropped first, so the frames just ahead of the playhead stay.
+    """
+
+    ready = pyqtSignal(int)
+
+    def __init__(self, size=FRAME_CACHE_SIZE, ahead=FRAME_PREFETCH):
+        super().__init__()
+        self.size = size
+        self.ahead = ahead
+        self.sequence = None
+        self.on_colour = None
+        self.border_colour = None
+        self.generation = 0
+        self.playhead = 0
+        self.pixmaps = {}
+        self.pending = set()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+
+    def reset(self, sequence, on_colour, border_colour):
+        """
+        Drop every frame and render ``sequence`` from now on. Renders in flight
+        are waited for, so the previous sequence can be closed afterwards.
+        """
+        self.skip_queued()
+        self.pool.waitForDone()
+        self.generation += 1
+        self.sequence = sequence
+        self.on_colour = on_colour
+        self.border_colour = border_colour
+        self.pixmaps.clear()
+
+    def skip_queued(self):
+        """
+        Forget renders that haven't started, after a seek.
+        """
+        self.pool.clear()
+        self.pending.clear()
+
+    def get(self, page):
+        return self.pixmaps.get(page)
+
+    def prefetch(self, page, loop=False):
+        """
+        Queue renders of the frames from ``page`` on, nearest first.
+        """
+        self.playhead = page
+        count = len(self.sequence)
+        for distance in range(min(self.ahead, count)):
+            n = page + distance
+            if n >= count:
+                if not loop:
+                    break
+                n -= count
+            if n not in self.pixmaps and n not in self.pending:
+                self.pending.add(n)
+                task = FrameTask(self.generation, self.sequence, n, self.on_colour, self.border_colour)
+                task.signals.finished.connect(self.on_finished)
+                self.pool.start(task, self.ahead - distance)
+
+    def on_finished(self, generation, page, image):
+        if generation != self.generation:
+            return
+        self.pending.discard(page)
+        self.pixmaps[page] = QPixmap.fromImage(image)
+        count = len(self.sequence)
+        while len(self.pixmaps) > self.size:
+            del self.pixmaps[max(self.pixmaps, key=lambda n: (n - self.playhead) % count)]
+        if page in self.pixmaps:
+            self.ready.emit(page)
+
+
+class RenderSignals(QObject):
+    finished = pyqtSignal(int, QImage, QImage)
+
+
+class RenderTask(QRunnable):
+    """
+    Renders the output and LED grid previews of a plane off the GUI thread.
+    QImages are safe to build here, the GUI thread turns them into pixmaps.
+    """
+
+    def __init__(self, generation, plane, on_colour, border_colour, depth=1):
+        super().__init__()
+        self.generation = generation
+        self.plane = plane
+        self.on_colour = on_colour
+        self.border_colour = border_colour
+        self.depth = depth
+        self.signals = RenderSignals()
+
+    def run(self):
+        # an exception escaping a QRunnable aborts PyQt, a failed render finishes with null images instead
+        try:
+            output_qi, preview_qi = self.render()
+        except Exception:
+            output_qi, preview_qi = QImage(), QImage()
+        self.signals.finished.emit(self.generation, output_qi, preview_qi)
+
+    def render(self):
+        height, width = self.plane.shape
+        with stage("preview.output"):
+            data = plane_to_image(self.plane, self.depth).tobytes("raw", "RGB")
+            output_qi = QImage(data, width, height, width * 3, QImage.Format.Format_RGB888).copy()
+
+        with stage("preview.led_grid"):
+            data = render_led_grid(self.plane, self.on_colour, self.border_colour, depth=self.depth).tobytes()
+            preview_qi = QImage(data, PREVIEW_SIZE, PREVIEW_SIZE, PREVIEW_SIZE * 3,
+                                QImage.Format.Format_RGB888).copy()
+        return output_qi, preview_qi
+
+
+class ExamplePicker(QDialog):
+    # noinspection PyArgumentList
+    def __init__(self, parent):
+        super(ExamplePicker, self).__init__(parent)
+        self.setModal(True)
+
+        self.item = ""
+
+        self.layout = QVBoxLayout()
+        self.setLayout(self.layout)
+
+        self.filter_layout = QHBoxLayout()
+        self.layout.addLayout(self.filter_layout)
+
+        self.top_layout = QHBoxLayout()
+        self.layout.addLayout(self.top_layout)
+
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        # searching is an index lookup, so this only needs to absorb bursts of typing
+        self.filter_timer.setInterval(50)
+        self.filter_timer.timeout.connect(self.update_filter)
+
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("Search...")
+        self.search.textChanged.connect(self.trigger_delayed_update)
+        self.search.returnPressed.connect(self.trigger_immediate_update)
+        self.filter_layout.addWidget(self.search)
+
+        self.names = list(example_files)
+        self.model = IconModel(thumbnails)
+        self.model.setStringList(self.names)
+
+        self.list_view = IconListView()
+        self.list_view.setViewMode(QListView.IconMode)
+        self.list_view.setModel(self.model)
+        self.list_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.list_view.doubleClicked.connect(self.select)
+        self.list_view.clicked.connect(lambda: self.select_btn.setEnabled(True))
+        self.list_view.setMinimumWidth(520)
+        self.top_layout.addWidget(self.list_view)
+
+        self.bottom_layout = QHBoxLayout()
+        self.layout.addLayout(self.bottom_layout)
+
+        self.credit = QLabel(f"MDI icons from <a href=\"https://pictogrammers.com/\" "
+                             f"style='color: {os.environ['QTMATERIAL_SECONDARYCOLOR']}'>Pictogrammers</a>")
+        self.credit.setOpenExternalLinks(True)
+        self.bottom_layout.addWidget(self.credit)
+
+        self.bottom_layout.addStretch()
+
+        self.cancel = QPushButton("Cancel")
+        self.cancel.clicked.connect(self.close)
+        self.bottom_layout.addWidget(self.cancel)
+
+        self.select_btn = QPushButton("Select")
+        self.select_btn.clicked.connect(self.select)
+        self.select_btn.setEnabled(False)
+        self.bottom_layout.addWidget(self.select_btn)
+
+        self.show()
+
+    def select(self):
+        indexes = self.list_view.selectedIndexes()
+        self.close()
+        self.item = indexes[0].data()
+
+    def update_filter(self):
+        self.model.setStringList([self.names[n] for n in example_index.search(self.search.text(), SEARCH_LIMIT)])
+        self.select_btn.setEnabled(False)
+
+    def trigger_delayed_update(self):
+        self.filter_timer.stop()
+        self.filter_timer.start()
+
+    def trigger_immediate_update(self):
+        self.filter_timer.stop()
+        self.update_filter()
+
+
+class IconListView(QListView):
+    """
+    A QListView that scales its grid size to ensure the same number of
+    columns are always drawn.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+    def resizeEvent(self, event):
+        """
+        Re-implemented to re-calculate the grid size to provide scaling icons
+
+        Parameters
+        ----------
+        event : QtCore.QEvent
+        """
+        width = self.viewport().width() - 30
+        # Minus 30 above ensures we don't end up with an item width that
+        # can't be drawn the expected number of times across the view without
+        # being wrapped.
+        # Without this, the view can flicker during resize
+        tile_width = width / 5
+        icon_width = int(tile_width * 0.8)
+        # tileWidth needs to be an integer for setGridSize
+        tile_width = int(tile_width)
+
+        self.setGridSize(QSize(tile_width, tile_width))
+        self.setIconSize(QSize(icon_width, icon_width))
+
+        return super().resizeEvent(event)
+
+
+class ThumbnailSignals(QObject):
+    finished = pyqtSignal(str, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    """
+    Loads and scales one example thumbnail off the GUI thread.
+    """
+
+    def __init__(self, name, path):
+        super().__init__()
+        self.name = name
+        self.path = path
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        image = QImage(self.path)
+        if not image.isNull():
+            image = image.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        self.signals.finished.emit(self.name, image)
+
+
+class ThumbnailCache(QObject):
+    """
+    A bounded, least recently used cache of example thumbnails, filled in the
+    background. ``get`` returns None for a thumbnail that isn't loaded yet and
+    queues it, ``ready`` is emitted once it is. The latest requests load
+    first, so the rows in view win over ones scrolled past.
+    """
+
+    ready = pyqtSignal(str)
+
+    def __init__(self, files, size=THUMBNAIL_CACHE_SIZE):
+        super().__init__()
+        self.files = files
+        self.size = size
+        self.pixmaps = OrderedDict()
+        self.pending = set()
+        self.requests = 0
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+
+    def get(self, name):
+        pixmap = self.pixmaps.get(name)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(name)
+            return pixmap
+
+        if name not in self.pending and name in self.files:
+            self.pending.add(name)
+            self.requests += 1
+            task = ThumbnailTask(name, self.files[name])
+            task.signals.finished.connect(self.on_loaded)
+            self.pool.start(task, self.requests)
+        return None
+
+    def on_loaded(self, name, image):
+        self.pending.discard(name)
+        self.pixmaps[name] = QPixmap.fromImage(image)
+        while len(self.pixmaps) > self.size:
+            self.pixmaps.popitem(last=False)
+        self.ready.emit(name)
+
+
+class IconModel(QStringListModel):
+
+    def __init__(self, thumbnails):
+        super().__init__()
+        self.thumbnails = thumbnails
+        self.rows = {}
+        thumbnails.ready.connect(self.thumbnail_ready)
+
+    def setStringList(self, strings):
+        super().setStringList(strings)
+        self.rows = {name: row for row, name in enumerate(strings)}
+
+    def thumbnail_ready(self, name):
+        row = self.rows.get(name)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def data(self, index, role):
+        """
+        Re-implemented to return the icon for the current index.
+
+        Parameters
+        ----------
+        index : QtCore.QModelIndex
+        role : int
+
+        Returns
+        -------
+        Any
+        """
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.thumbnails.get(super().data(index, Qt.ItemDataRole.DisplayRole))
+        return super().data(index, role)
+
+
+def load_examples():
+    """
+    Index the example gallery once, display name -> image file.
+    """
+    with open(os.path.join(os.path.curdir, "examples.json")) as ex_file:
+        examples = json.loads(ex_file.read())
+    return {name: os.path.join(os.path.curdir, "examples", file) for file, name in examples["name_pairs"].items()}
+
+
+def run(args, version, author):
+    global example_files, example_index, thumbnails, secondary_color
+
+    app = QApplication(sys.argv)
+    app.setApplicationName("DMD Page Builder")
+    app.setApplicationVersion(version)
+    app.setOrganizationName(author)
+
+    qt_material.apply_stylesheet(app, "theme.xml", css_file="m3-style.qss")
+    secondary_color = os.environ["QTMATERIAL_SECONDARYCOLOR"]
+    example_files = load_examples()
+    example_index = SearchIndex(list(example_files),
+                                [[os.path.splitext(os.path.basename(path))[0]] for path in example_files.values()])
+    thumbnails = ThumbnailCache(example_files)
+
+    window = MainWindow(args)
+    return app.exec()
@@ -1,702 +1,203 @@
-import json
 import os
-import statistics
 import sys
-import platform
 import argparse
+import time
 
-from PIL import Image, ImageOps, ImageColor
-
-from PyQt5.QtCore import *
-from PyQt5.QtGui import *
-from PyQt5.QtWidgets import *
-import qt_material
-import qtawesome as qta
-
-if platform.system() == "Windows" and platform.release() == "10":
-    from pyqt_windows_os_light_dark_theme_window.main import Window
-else:
-    Window = QWidget
+import dmdprofile
+from dmdcore import parse_size, PAGE_SIZE, RESIZE_POLICIES, DITHER_MODES, MAX_DEPTH, FORMAT_V2, FORMAT_V3
 
 __version__ = "v0.3.0"
 __author__ = "Kevin Ahr"
 
-MAX_FILE_PREVIEW_LEN = 40
-
-preview_colors = {"Red": (255, 20, 20),
-                  "Green": (20, 255, 20),
-                  "Yellow": (255, 255, 30),
-                  "Blue": (20, 20, 255),
-                  "White": (250, 250, 250)}
-
-with open(os.path.join(os.path.curdir, "examples.json")) as ex_file:
-    examples = json.loads(ex_file.read())
-
-
-def str_trunc(string: str, nchars: int):
-    return (string[:nchars - 1] + "…")[:min(len(string), nchars)]
-
-
-def remove_transparency(im, bg_colour=(255, 255, 255)):
-    # Only process if image has transparency (http://stackoverflow.com/a/1963146)
-    if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
-
-        # Need to convert to RGBA if LA format due to a bug in PIL (http://stackoverflow.com/a/1963146)
-        alpha = im.convert('RGBA').split()[-1]
-
-        # Create a new background image of our matt color.
-        # Must be RGBA because paste requires both images to have the same format
-        # (http://stackoverflow.com/a/8720632  and  http://stackoverflow.com/a/9459208)
-        bg = Image.new("RGBA", im.size, bg_colour + (255,))
-        bg.paste(im, mask=alpha)
-        return bg
-
-    else:
-        return im
-
-
-def convert(in_file, output, threshold=50, invert=False):
-    image = Image.open(in_file)
-
-    image = remove_transparency(image, (0, 0, 0))
-    image = image.convert("RGB")
-
-    if invert:
-        image = ImageOps.invert(image)
-
-    raw_data = slice_per(list(image.getdata()), 32)
-
-    for yi, y in enumerate(raw_data):
-        for xi, x in enumerate(y):
-            if statistics.mean(x) > threshold:
-                raw_data[yi][xi] = (255, 255, 255)
-            else:
-                raw_data[yi][xi] = (0, 0, 0)
-
-    image = Image.new(image.mode, image.size)
-    image.putdata(flatten(raw_data))
-    image = image.rotate(-90)
-    image = ImageOps.mirror(image)
-
-    data = list(image.getdata())
-
-    for index, pixel in enumerate(data):
-        if pixel == (255, 255, 255):
-            data[index] = 0x01
-        else:
-            data[index] = 0x00
-
-    data.insert(0, 1)
-
-    with open(output, "wb") as file:
-        file.write(bytes(data))
-
-
-def slice_per(source, step):
-    return [source[i::step] for i in range(step)]
-
-
-def flatten(li):
-    return [item for sublist in li for item in sublist]
-
-
-class MainWindow(Window):
-    # noinspection PyArgumentList
-    def __init__(self):
-        super(MainWindow, self).__init__()
-        self.setWindowTitle("DMD Page Builder")
-        self.setWindowIcon(QIcon("icon.svg"))
-
-        self.file = ""
-
-        self.threshold = args.threshold
-        self.invert = False
-        self.timemult = 1
-
-        self.example_picker = None
-
-        self.layout = QVBoxLayout()
-        self.layout.setContentsMargins(2, 2, 2, 2)
-        self.setLayout(self.layout)
-
-        self.widget = QTabWidget()
-        self.layout.addWidget(self.widget)
-
-        self.load_widget = QWidget()
-        self.load_root_layout = QHBoxLayout()
-        self.load_layout = QVBoxLayout()
-        self.load_root_layout.addLayout(self.load_layout)
-        self.load_widget.setLayout(self.load_root_layout)
-        self.widget.addTab(self.load_widget, "Load")
-
-        self.edit_widget = QWidget()
-        self.edit_layout = QVBoxLayout()
-        self.edit_widget.setLayout(self.edit_layout)
-        self.widget.addTab(self.edit_widget, "Edit")
-
-        self.preview_widget = QWidget()
-        self.preview_layout = QVBoxLayout()
-        self.preview_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.preview_widget.setLayout(self.preview_layout)
-        self.widget.addTab(self.preview_widget, "Preview")
-
-        self.about_widget = QWidget()
-        self.about_layout = QVBoxLayout()
-        self.about_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.about_widget.setLayout(self.about_layout)
-        self.widget.addTab(self.about_widget, "About")
-
-        self.file_layout = QHBoxLayout()
-        self.load_layout.addLayout(self.file_layout)
-
-        self.file_button = QPushButton("Pick File")
-        self.file_button.setIcon(qta.icon("mdi.upload", color=secondary_color))
-        self.file_button.setIconSize(QSize(32, 32))
-        self.file_button.clicked.connect(lambda: self.load_source())  # lambda required to run dialog
-        self.file_layout.addWidget(self.file_button)
 
-        self.file_button = QPushButton("Pick an Example")
-        self.file_button.setIcon(qta.icon("mdi.image", color=secondary_color))
-        self.file_button.setIconSize(QSize(32, 32))
-        self.file_button.clicked.connect(self.load_example)
-        self.file_layout.addWidget(self.file_button)
-
-        self.save_quick_button = QPushButton("Quick Export")
-        self.save_quick_button.setIcon(qta.icon("mdi.micro-sd", color=secondary_color))
-        self.save_quick_button.setIconSize(QSize(32, 32))
-        self.save_quick_button.clicked.connect(self.save_dmd)
-        self.load_layout.addWidget(self.save_quick_button)
-
-        self.file_text = QLabel(str_trunc("No file selected", MAX_FILE_PREVIEW_LEN))
-        self.load_layout.addWidget(self.file_text)
-
-        self.load_layout.addStretch()
-
-        self.source_preview = QLabel()
-        self.source_preview.setPixmap(QPixmap("error.png").scaled(256, 256))
-        self.source_preview.setFixedSize(QSize(256, 256))
-        self.source_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.load_layout.addWidget(self.source_preview, alignment=Qt.AlignmentFlag.AlignCenter)
-
-        self.load_layout.addStretch()
-
-        self.edit_top_layout = QGridLayout()
-        self.edit_layout.addLayout(self.edit_top_layout)
-
-        self.edit_layout.addStretch()
-
-        self.source_label = QLabel("Source")
-        self.edit_top_layout.addWidget(self.source_label, 0, 0)
-
-        self.out_label = QLabel("Output")
-        self.edit_top_layout.addWidget(self.out_label, 0, 1)
-
-        self.source_preview_2 = QLabel()
-        self.source_preview_2.setPixmap(QPixmap("error.png").scaled(128, 128))
-        self.source_preview_2.setFixedSize(QSize(128, 128))
-        self.source_preview_2.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.edit_top_layout.addWidget(self.source_preview_2, 1, 0)
-
-        self.output_preview = QLabel()
-        self.output_preview.setPixmap(QPixmap("error.png").scaled(128, 128))
-        self.output_preview.setFixedSize(QSize(128, 128))
-        self.output_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.edit_top_layout.addWidget(self.output_preview, 1, 1)
-
-        self.invert_check = QCheckBox("Invert")
-        self.invert_check.setChecked(self.invert)
-        self.invert_check.toggled.connect(self.create_image)
-        self.edit_layout.addWidget(self.invert_check)
-
-        self.threshold_layout = QHBoxLayout()
-        self.edit_layout.addLayout(self.threshold_layout)
-
-        self.threshold_label = QLabel("Threshold")
-        self.threshold_layout.addWidget(self.threshold_label)
-
-        self.threshold_slider = QSlider(Qt.Orientation.Horizontal)
-        self.threshold_slider.setRange(-1, 255)
-        self.threshold_slider.setValue(self.threshold)
-        self.threshold_slider.valueChanged.connect(self.create_image)
-        self.threshold_layout.addWidget(self.threshold_slider)
-
-        self.multiplier_layout = QHBoxLayout()
-        self.edit_layout.addLayout(self.multiplier_layout)
-
-        self.multiplier_label = QLabel("Page Time Multiplier")
-        self.multiplier_layout.addWidget(self.multiplier_label)
-
-        self.multiplier_spin = QSpinBox()
-        self.multiplier_spin.setValue(self.timemult)
-        self.multiplier_spin.setRange(1, 20)
-        self.multiplier_spin.valueChanged.connect(self.on_mult_spin)
-        self.multiplier_layout.addWidget(self.multiplier_spin)
-
-        self.bottom_layout = QHBoxLayout()
-        self.edit_layout.addLayout(self.bottom_layout)
-
-        self.save_pc_button = QPushButton("Save for PC")
-        self.save_pc_button.setIcon(qta.icon("mdi.content-save", color=secondary_color))
-        self.save_pc_button.setIconSize(QSize(32, 32))
-        self.save_pc_button.clicked.connect(self.save_pc)
-        self.bottom_layout.addWidget(self.save_pc_button)
-
-        self.save_dmd_button = QPushButton("Save for DMD")
-        self.save_dmd_button.setIcon(qta.icon("mdi.micro-sd", color=secondary_color))
-        self.save_dmd_button.setIconSize(QSize(32, 32))
-        self.save_dmd_button.clicked.connect(self.save_dmd)
-        self.bottom_layout.addWidget(self.save_dmd_button)
-
-        self.preview_top_layout = QHBoxLayout()
-        self.preview_layout.addLayout(self.preview_top_layout)
-
-        self.preview_color = QComboBox()
-        self.preview_color.addItems(["Red", "Green", "Yellow", "Blue", "White"])
-        self.preview_color.currentIndexChanged.connect(self.create_image)
-        self.preview_top_layout.addWidget(self.preview_color)
-
-        self.preview = QLabel()
-        self.preview_layout.addWidget(self.preview)
-
-        self.about_icon = QLabel()
-        self.about_icon.setPixmap(QPixmap("icon-large.svg").scaled(192, 192,
-                                  transformMode=Qt.TransformationMode.SmoothTransformation))
-        self.about_layout.addWidget(self.about_icon)
-
-        self.about_title = QLabel("DMD PageBuilder")
-        self.about_title.setObjectName("H1")
-        self.about_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.about_layout.addWidget(self.about_title)
-
-        self.about_version = QLabel(__version__)
-        self.about_version.setObjectName("H2")
-        self.about_version.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.about_layout.addWidget(self.about_version)
+def run_single():
+    from dmdstream import convert_path
+    from dmdcache import PageCache
 
-        self.about_author = QLabel(f"By: {__author__}")
-        self.about_author.setObjectName("H2")
-        self.about_author.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.about_layout.addWidget(self.about_author)
+    # checks, "-" is stdin or stdout
+    if args.input != "-" and not os.path.isfile(args.input):
+        print(f"input, {args.input} is not a file")
+        sys.exit()
+    if os.path.isdir(args.output):
+        print(f"output, {args.output} is not a valid file")
+        sys.exit()
+    convert_path(args.input, args.output, threshold=args.threshold, invert=args.invert,
+                 cache=None if args.no_cache else PageCache(), version=FORMAT_V2 if args.legacy else FORMAT_V3,
+                 size=args.size, policy=args.resize, dither=args.dither,
+                 depth=args.depth)
+    print(f"Converted {args.input} successfully", file=sys.stderr if args.output == "-" else sys.stdout)
 
-        if os.path.isfile(args.input):
-            self.im = Image.open(args.input)
-            self.file = args.input
-            self.load_source(False)
-        else:
-            self.im = Image.open("error.png")
-            self.file = ""
 
-        self.create_image()
-        self.show()
+def run_batch():
+    from dmdbatch import convert_directory
+    from dmdcache import default_cache_dir
 
-    def load_source(self, dialog=True):
-        print(dialog)
-        if dialog:
-            dialog = QFileDialog(self)
-            dialog.setNameFilter("Supported Images (*.png *.jpg *.bmp *.dib *.jpg "
-                                 "*.jpeg *.jpe *.jfif *.tiff *.tif *.webp *.dmd)\n"
-                                 "Raster Images (*.png *.jpg *.bmp *.dib *.jpg "
-                                 "*.jpeg *.jpe *.jfif *.tiff *.tif *.webp)\nDMD Images (*.dmd)")
-            out = dialog.exec()
+    # checks
+    if not os.path.isdir(args.input):
+        print(f"input, {args.input} is not a directory")
+        sys.exit()
+    if os.path.isfile(args.output):
+        print(f"output, {args.output} is not a valid directory")
+        sys.exit()
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    converted = 0
+    failed = 0
+    for in_file, output, error in convert_directory(args.input, args.output, args.threshold, args.invert,
+                                                    args.jobs,
+                                                    cache_dir=None if args.no_cache else default_cache_dir(),
+                                                    version=FORMAT_V2 if args.legacy else FORMAT_V3,
+                                                    size=args.size, policy=args.resize, dither=args.dither,
+                                                    depth=args.depth):
+        if error:
+            failed += 1
+            print(f"Failed to convert {in_file}: {error}")
         else:
-            out = True
-        if out:
-            if dialog:
-                self.file = dialog.selectedFiles()[0]
-
-            if self.file.endswith(".dmd"):
-                with open(self.file, 'rb') as file:
-                    data = file.read()
-
-                if len(data) == 1025:
-                    start_byte = 1
-                    self.timemult = data[0]
-                    self.multiplier_spin.setValue(self.timemult)
-                elif len(data) == 1024:
-                    start_byte = 0
-                else:
-                    msg = QMessageBox()
-                    msg.setIcon(QMessageBox.Warning)
-                    msg.setText(f"Image is corrupt\nExpected 1025/1024 bytes, Got {len(data)} bytes")
-                    msg.setWindowTitle("Image Error")
-                    msg.setStandardButtons(QMessageBox.Ok)
-                    msg.exec_()
-                    return
-
-                pixels = []
-                for byte in data[start_byte:]:
-                    pixel = 0 if byte == 0x00 else 255
-                    pixels.append(pixel)
-
-                self.im = Image.new('L', (32, 32))
-                self.im.putdata(pixels)
+            converted += 1
+    elapsed = time.perf_counter() - start
 
-                self.file_text.setText(str_trunc(self.file, MAX_FILE_PREVIEW_LEN))
-                preview_im = self.im
-                preview_im = remove_transparency(preview_im, (0, 0, 0))
-                preview_im = preview_im.convert("RGB")
-                data = preview_im.tobytes("raw", "RGB")
-                qi = QImage(data, preview_im.size[0], preview_im.size[1], preview_im.size[0] * 3,
-                            QImage.Format.Format_RGB888)
-                preview_pixmap = QPixmap(qi)
-                self.source_preview.setPixmap(preview_pixmap.scaled(256, 256))
-                self.source_preview_2.setPixmap(preview_pixmap.scaled(128, 128))
+    print(f"Converted {converted} files ({failed} failed) in {elapsed:.2f}s, "
+          f"{converted / elapsed if elapsed else 0:.1f} pages/s with {args.jobs or os.cpu_count()} jobs")
 
-                self.create_image()
-            else:
-                self.im = Image.open(self.file)
-                if self.im.size != (32, 32):
-                    msg = QMessageBox()
-                    msg.setIcon(QMessageBox.Warning)
-                    msg.setText("Image Size must be 32x32")
-                    msg.setWindowTitle("Image Size")
-                    msg.setStandardButtons(QMessageBox.Ok)
-                    msg.exec_()
-                else:
-                    self.file_text.setText(str_trunc(self.file, MAX_FILE_PREVIEW_LEN))
-                    preview_im = self.im
-                    preview_im = remove_transparency(preview_im, (0, 0, 0))
-                    preview_im = preview_im.convert("RGB")
-                    data = preview_im.tobytes("raw", "RGB")
-                    qi = QImage(data, preview_im.size[0], preview_im.size[1], preview_im.size[0] * 3,
-                                QImage.Format.Format_RGB888)
-                    preview_pixmap = QPixmap(qi)
-                    self.source_preview.setPixmap(preview_pixmap.scaled(256, 256))
-                    self.source_preview_2.setPixmap(preview_pixmap.scaled(128, 128))
-
-                    self.create_image()
-
-    def open_example(self, file, name):
-        self.im = Image.open(file)
-
-        self.file_text.setText(str_trunc(f"Example, {name}", MAX_FILE_PREVIEW_LEN))
-        preview_im = self.im
-        preview_im = remove_transparency(preview_im, (0, 0, 0))
-        preview_im = preview_im.convert("RGB")
-        data = preview_im.tobytes("raw", "RGB")
-        qi = QImage(data, preview_im.size[0], preview_im.size[1], preview_im.size[0] * 3,
-                    QImage.Format.Format_RGB888)
-        preview_pixmap = QPixmap(qi)
-        self.source_preview.setPixmap(preview_pixmap.scaled(256, 256))
-        self.source_preview_2.setPixmap(preview_pixmap.scaled(128, 128))
-
-    def load_example(self):
-        self.example_picker = ExamplePicker(window)
-        self.example_picker.exec()
-
-        if self.example_picker.item:
-            self.open_example(os.path.join(os.path.curdir, "examples",
-                                           list(examples["name_pairs"].keys())
-                                           [list(examples["name_pairs"].values()).index(self.example_picker.item)]),
-                              self.example_picker.item)
-            self.file = os.path.join(os.path.curdir, "examples",
-                                     list(examples["name_pairs"].keys())
-                                     [list(examples["name_pairs"].values()).index(self.example_picker.item)])
-            self.create_image()
 
-    def create_image(self):
-        self.invert = self.invert_check.isChecked()
-        self.threshold = self.threshold_slider.value()
+def run_watch():
+    from dmdwatch import watch_directory
+    from dmdcache import default_cache_dir
 
-        if self.file:
-            if self.file.endswith(".dmd"):
-                with open(self.file, 'rb') as file:
-                    data = file.read()
-
-                pixels = []
-                for byte in data[1:]:
-                    pixel = 0 if byte == 0x00 else 255
-                    pixels.append(pixel)
-
-                self.im = Image.new('L', (32, 32))
-                self.im.putdata(pixels)
+    # checks
+    if not os.path.isdir(args.input):
+        print(f"input, {args.input} is not a directory")
+        sys.exit()
+    if os.path.isfile(args.output):
+        print(f"output, {args.output} is not a valid directory")
+        sys.exit()
+    os.makedirs(args.output, exist_ok=True)
+
+    print(f"Watching {args.input}, press Ctrl+C to stop")
+    try:
+        for action, name, error in watch_directory(args.input, args.output, args.threshold, args.invert,
+                                                   workers=args.jobs,
+                                                   cache_dir=None if args.no_cache else default_cache_dir(),
+                                                   version=FORMAT_V2 if args.legacy else FORMAT_V3,
+                                                   size=args.size, policy=args.resize, dither=args.dither,
+                                                   depth=args.depth, poll=args.poll, interval=args.interval):
+            if error:
+                print(f"Failed to convert {name}: {error}")
             else:
-                self.im = Image.open(self.file)
-        else:
-            self.im = Image.open("error.png")
-
-        self.im = remove_transparency(self.im, (0, 0, 0))
-        self.im = self.im.convert("RGB")
-
-        if self.invert:
-            self.im = ImageOps.invert(self.im)
-
-        raw_data = slice_per(list(self.im.getdata()), 32)
-
-        for yi, y in enumerate(raw_data):
-            for xi, x in enumerate(y):
-                if self.invert:
-                    threshold = 255 - self.threshold
-                else:
-                    threshold = self.threshold
-
-                if statistics.mean(x) > threshold:
-                    raw_data[yi][xi] = (255, 255, 255)
-                else:
-                    raw_data[yi][xi] = (0, 0, 0)
-
-        self.im = Image.new(self.im.mode, self.im.size)
-        self.im.putdata(flatten(raw_data))
-        self.im = self.im.rotate(-90)
-        self.im = ImageOps.mirror(self.im)
-
-        preview_im = self.im
-        preview_im = preview_im.convert("RGB")
-        data = preview_im.tobytes("raw", "RGB")
-
-        qi = QImage(data, preview_im.size[0], preview_im.size[1], preview_im.size[0] * 3,
-                    QImage.Format.Format_RGB888)
-
-        preview_pixmap = QPixmap(qi)
-        self.output_preview.setPixmap(preview_pixmap.scaled(128, 128))
-
-        upscaled_image = Image.new("RGB", (256, 256))  # White border color
-
-        upscaled_size = (256, 256)
-        border = 4
-        bcolor = ImageColor.getcolor(os.environ["QTMATERIAL_SECONDARYDARKCOLOR"], "RGB")
-
-        pixels = []
-        for y in range(upscaled_size[1]):
-            for x in range(upscaled_size[0]):
-                if x % (upscaled_size[0] / 32) < border or y % (upscaled_size[1] / 32) < border:
-                    color = bcolor
-                else:
-                    px = int(x / (upscaled_size[0] / 32))
-                    py = int(y / (upscaled_size[1] / 32))
-
-                    if preview_im.getpixel((px, py)) == (255, 255, 255):
-                        color = preview_colors[self.preview_color.currentText()]
-                    else:
-                        color = preview_im.getpixel((px, py))
-
-                pixels.append(color)
-
-        upscaled_image.putdata(pixels)
-
-        upscaled_image = upscaled_image.transform(upscaled_image.size, Image.AFFINE,
-                                                  (1, 0, border // 2, 0, 1, border // 2),
-                                                  fillcolor=bcolor)
-        data = upscaled_image.tobytes("raw", "RGB")
-
-        qi = QImage(data, upscaled_image.size[0], upscaled_image.size[1], upscaled_image.size[0] * 3,
-                    QImage.Format.Format_RGB888)
-
-        self.preview.setPixmap(QPixmap(qi))
-
-    def save_pc(self):
-        dialog = QFileDialog(self)
-        out = dialog.getSaveFileName(filter="Bitmap Image (*.bmp)", parent=self)
-        if out[0]:
-            self.im.save(out[0])
-
-    def save_dmd(self):
-        dialog = QFileDialog(self)
-        out = dialog.getSaveFileName(filter="DMD Image (*.dmd)", parent=self)
-        if out[0]:
-            data = list(self.im.getdata())
-
-            for index, pixel in enumerate(data):
-                if pixel == (255, 255, 255):
-                    data[index] = 0x01
-                else:
-                    data[index] = 0x00
-
-            data.insert(0, self.timemult)
-
-            with open(out[0], "wb") as file:
-                file.write(bytes(data))
-
-    def on_mult_spin(self):
-        self.timemult = self.multiplier_spin.value()
-
-
-class ExamplePicker(QDialog):
-    # noinspection PyArgumentList
-    def __init__(self, parent):
-        super(ExamplePicker, self).__init__(parent)
-        self.setModal(True)
-
-        self.item = ""
-
-        self.layout = QVBoxLayout()
-        self.setLayout(self.layout)
-
-        self.filter_layout = QHBoxLayout()
-        self.layout.addLayout(self.filter_layout)
+                print(f"{action.capitalize()} {name}")
+    except KeyboardInterrupt:
+        pass
+
+
+def run_serve():
+    from dmdserve import serve
+    from dmdcache import default_cache_dir
+
+    print(f"Serving on {args.socket or f'http://127.0.0.1:{args.port}'}, press Ctrl+C to stop")
+    try:
+        serve(args.port, args.socket, args.threshold, args.invert, args.jobs,
+              cache_dir=None if args.no_cache else default_cache_dir(),
+              version=FORMAT_V2 if args.legacy else FORMAT_V3, size=args.size, policy=args.resize,
+              dither=args.dither, depth=args.depth)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_stream():
+    from dmdstream import convert_stream
+    from dmdcache import default_cache_dir
+
+    try:
+        count = convert_stream(sys.stdin.buffer, sys.stdout.buffer, args.framing, args.jobs or 1,
+                               None if args.no_cache else default_cache_dir(), threshold=args.threshold,
+                               invert=args.invert, version=FORMAT_V2 if args.legacy else FORMAT_V3,
+                               size=args.size, policy=args.resize, dither=args.dither, depth=args.depth)
+    except BrokenPipeError:
+        # the reader went away, as with `| head`; keep the interpreter from failing to flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(f"Failed to convert stream: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Converted {count} images", file=sys.stderr)
+
+
+def run_deploy():
+    from dmddeploy import deploy_directory
+    from dmdcache import PageCache
 
-        self.top_layout = QHBoxLayout()
-        self.layout.addLayout(self.top_layout)
-
-        self.filter_timer = QTimer(self)
-        self.filter_timer.setSingleShot(True)
-        self.filter_timer.setInterval(500)
-        self.filter_timer.timeout.connect(self.update_filter)
-
-        self.search = QLineEdit()
-        self.search.setPlaceholderText("Search...")
-        self.search.textChanged.connect(self.trigger_delayed_update)
-        self.search.returnPressed.connect(self.trigger_immediate_update)
-        self.filter_layout.addWidget(self.search)
-
-        icon_files = examples["name_pairs"].values()
-
-        model = IconModel()
-        model.setStringList(icon_files)
-
-        self.proxy_model = QSortFilterProxyModel()
-        self.proxy_model.setSourceModel(model)
-        self.proxy_model.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-
-        self.list_view = IconListView()
-        self.list_view.setViewMode(QListView.IconMode)
-        self.list_view.setModel(self.proxy_model)
-        self.list_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.list_view.doubleClicked.connect(self.select)
-        self.list_view.clicked.connect(lambda: self.select_btn.setEnabled(True))
-        self.list_view.setMinimumWidth(520)
-        self.top_layout.addWidget(self.list_view)
-
-        self.bottom_layout = QHBoxLayout()
-        self.layout.addLayout(self.bottom_layout)
-
-        self.credit = QLabel(f"MDI icons from <a href=\"https://pictogrammers.com/\" "
-                             f"style='color: {os.environ['QTMATERIAL_SECONDARYCOLOR']}'>Pictogrammers</a>")
-        self.credit.setOpenExternalLinks(True)
-        self.bottom_layout.addWidget(self.credit)
-
-        self.bottom_layout.addStretch()
-
-        self.cancel = QPushButton("Cancel")
-        self.cancel.clicked.connect(self.close)
-        self.bottom_layout.addWidget(self.cancel)
-
-        self.select_btn = QPushButton("Select")
-        self.select_btn.clicked.connect(self.select)
-        self.select_btn.setEnabled(False)
-        self.bottom_layout.addWidget(self.select_btn)
-
-        self.show()
-
-    def select(self):
-        indexes = self.list_view.selectedIndexes()
-        self.close()
-        self.item = indexes[0].data()
-
-    def update_filter(self):
-        re_string = ""
-
-        search_term = self.search.text()
-        if search_term:
-            re_string += ".*%s.*$" % search_term
-
-        try:
-            self.proxy_model.setFilterRegularExpression(re_string)
-        except AttributeError:
-            self.proxy_model.setFilterRegExp(re_string)
-
-    def trigger_delayed_update(self):
-        self.filter_timer.stop()
-        self.filter_timer.start()
-
-    def trigger_immediate_update(self):
-        self.filter_timer.stop()
-        self.update_filter()
-
-
-class IconListView(QListView):
-    """
-    A QListView that scales its grid size to ensure the same number of
-    columns are always drawn.
-    """
-
-    def __init__(self, parent=None):
-        super().__init__(parent)
-
-    def resizeEvent(self, event):
-        """
-        Re-implemented to re-calculate the grid size to provide scaling icons
-
-        Parameters
-        ----------
-        event : QtCore.QEvent
-        """
-        width = self.viewport().width() - 30
-        # Minus 30 above ensures we don't end up with an item width that
-        # can't be drawn the expected number of times across the view without
-        # being wrapped.
-        # Without this, the view can flicker during resize
-        tile_width = width / 5
-        icon_width = int(tile_width * 0.8)
-        # tileWidth needs to be an integer for setGridSize
-        tile_width = int(tile_width)
-
-        self.setGridSize(QSize(tile_width, tile_width))
-        self.setIconSize(QSize(icon_width, icon_width))
-
-        return super().resizeEvent(event)
-
-
-class IconModel(QStringListModel):
-
-    def __init__(self):
-        super().__init__()
-
-    def flags(self, index):
-        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
-
-    def data(self, index, role):
-        """
-        Re-implemented to return the icon for the current index.
-
-        Parameters
-        ----------
-        index : QtCore.QModelIndex
-        role : int
-
-        Returns
-        -------
-        Any
-        """
-        if role == Qt.ItemDataRole.DecorationRole:
-            icon_string = self.data(index, role=Qt.ItemDataRole.DisplayRole)
-            return QPixmap(os.path.join(os.path.curdir, "examples",
-                                        list(examples["name_pairs"].keys())
-                                        [list(examples["name_pairs"].values()).index(icon_string)]))
-        return super().data(index, role)
-
-
-def run_single():
     # checks
-    if not os.path.isfile(args.input):
-        print(f"input, {args.input} is not a file")
+    if not os.path.isdir(args.input):
+        print(f"input, {args.input} is not a directory")
         sys.exit()
-    if os.path.isdir(args.output):
-        print(f"output, {args.output} is not a valid file")
+    if not os.path.isdir(args.output):
+        print(f"output, {args.output} is not a directory")
         sys.exit()
-    convert(args.input, args.output, args.threshold, args.invert)
-    print(f"Converted {args.input} successfully")
+
+    try:
+        report = deploy_directory(args.input, args.output, alpha=args.alpha, delete=args.delete,
+                                  cache=None if args.no_cache else PageCache(), threshold=args.threshold,
+                                  invert=args.invert, version=FORMAT_V2 if args.legacy else FORMAT_V3,
+                                  size=args.size, policy=args.resize, dither=args.dither, depth=args.depth)
+    except (OSError, ValueError) as e:
+        print(f"Failed to deploy {args.input}: {e}")
+        sys.exit(1)
+    print(f"Wrote {report['written']} pages ({report['bytes']} bytes), {report['unchanged']} unchanged, "
+          f"{report['removed']} removed in {report['seconds']:.2f}s")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Convert raster images to DMD')
-    parser.add_argument("--mode", default="gui", type=str, choices=["gui", "single", "batch"],
+    parser.add_argument("--mode", default="gui", type=str,
+                        choices=["gui", "single", "batch", "watch", "serve", "stream", "deploy"],
                         help="mode to run program")
-    parser.add_argument("--input", default=os.path.abspath(os.curdir), type=str, help="input path or file")
-    parser.add_argument("--output", default=os.path.abspath(os.curdir), type=str, help="output path or file")
+    parser.add_argument("--input", default=os.path.abspath(os.curdir), type=str,
+                        help="input path or file, - for stdin in single mode")
+    parser.add_argument("--output", default=os.path.abspath(os.curdir), type=str,
+                        help="output path or file, - for stdout in single mode")
     parser.add_argument("--threshold", default=50, type=int, help="on/off threshold (0~255)")
     parser.add_argument("--invert", default=False, type=bool, help="invert on/off pixels")
+    parser.add_argument("--jobs", default=None, type=int, help="batch worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the conversion cache")
+    parser.add_argument("--legacy", action="store_true", help="write DMD v2 pages for older loaders")
+    parser.add_argument("--size", default=PAGE_SIZE, type=parse_size, help="page size, WIDTHxHEIGHT (default: 32x32)")
+    parser.add_argument("--resize", default="fit", choices=RESIZE_POLICIES,
+                        help="fit, fill or crop sources that aren't the page size")
+    parser.add_argument("--dither", default="none", choices=DITHER_MODES, help="dithering instead of a plain threshold")
+    parser.add_argument("--depth", default=1, type=int, choices=range(1, MAX_DEPTH + 1), metavar="BITS",
+                        help="bits per pixel, over 1 writes multi-level (grayscale) v3 pages")
+    parser.add_argument("--poll", action="store_true", help="watch by polling even where inotify is available")
+    parser.add_argument("--interval", default=2.0, type=float, help="seconds between polls in watch mode")
+    parser.add_argument("--port", default=8032, type=int, help="serve mode port on 127.0.0.1")
+    parser.add_argument("--socket", default=None, type=str, help="serve mode Unix socket path instead of a port")
+    parser.add_argument("--framing", default="concat", choices=["concat", "prefixed"],
+                        help="stream mode framing, back to back files or 4 byte big-endian length prefixes")
+    parser.add_argument("--alpha", action="store_true", help="deploy mode, convert 0000-9999 to aaaa-jjjj")
+    parser.add_argument("--delete", action="store_true", help="deploy mode, remove pages the input doesn't have")
+    dmdprofile.add_argument(parser)
     args = parser.parse_args()
+    if args.depth > 1 and args.dither != "none":
+        parser.error("--dither makes 1 bit pages, it can't be combined with --depth")
+    if args.legacy and tuple(args.size) != PAGE_SIZE:
+        parser.error(f"DMD v2 pages are {PAGE_SIZE[0]}x{PAGE_SIZE[1]}, --legacy can't be combined with --size")
+    if args.legacy and args.depth > 1:
+        parser.error("DMD v2 pages are 1 bit per pixel, --legacy can't be combined with --depth")
+    dmdprofile.enable_from_args(args)
 
     if args.mode == "gui":
-        app = QApplication(sys.argv)
-        app.setApplicationName("DMD Page Builder")
-        app.setApplicationVersion(__version__)
-
-        qt_material.apply_stylesheet(app, "theme.xml", css_file="m3-style.qss")
-        secondary_color = os.environ["QTMATERIAL_SECONDARYCOLOR"]
-
-        window = MainWindow()
-        sys.exit(app.exec())
+        # Qt is only imported when the GUI runs, the conversion modes start without it
+        import gui
+        sys.exit(gui.run(args, __version__, __author__))
     elif args.mode == "single":
         run_single()
+    elif args.mode == "batch":
+        run_batch()
+    elif args.mode == "watch":
+        run_watch()
+    elif args.mode == "serve":
+        run_serve()
+    elif args.mode == "stream":
+        run_stream()
+    elif args.mode == "deploy":
+        run_deploy()
@@ -1,77 +1,28 @@
-from PIL import Image, ImageOps
-import sys
-import statistics
 import argparse
 
+from dmdcore import parse_size, PAGE_SIZE, RESIZE_POLICIES, DITHER_MODES, MAX_DEPTH, FORMAT_V2, FORMAT_V3
+from dmdstream import convert_path
+import dmdprofile
+
 
 parser = argparse.ArgumentParser(description='Convert raster images to DMD')
-parser.add_argument('input', help='Input raster')
-parser.add_argument('output', help='output DMD image')
+parser.add_argument('input', help='Input raster, - for stdin')
+parser.add_argument('output', help='output DMD image, - for stdout')
+parser.add_argument('--legacy', help='write a DMD v2 page for older loaders', action='store_true')
+parser.add_argument('--size', help='page size, WIDTHxHEIGHT (default: 32x32)', default=PAGE_SIZE, type=parse_size)
+parser.add_argument('--resize', help='fit, fill or crop sources that aren\'t the page size', default='fit',
+                    choices=RESIZE_POLICIES)
+parser.add_argument('--dither', help='dithering instead of a plain threshold', default='none', choices=DITHER_MODES)
+parser.add_argument('--depth', help='bits per pixel, over 1 writes multi-level (grayscale) v3 pages', default=1,
+                    type=int, choices=range(1, MAX_DEPTH + 1), metavar='BITS')
+dmdprofile.add_argument(parser)
 
 args = parser.parse_args()
-
-
-def remove_transparency(im, bg_colour=(255, 255, 255)):
-    # Only process if image has transparency (http://stackoverflow.com/a/1963146)
-    if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
-
-        # Need to convert to RGBA if LA format due to a bug in PIL (http://stackoverflow.com/a/1963146)
-        alpha = im.convert('RGBA').split()[-1]
-
-        # Create a new background image of our matt color.
-        # Must be RGBA because paste requires both images to have the same format
-        # (http://stackoverflow.com/a/8720632  and  http://stackoverflow.com/a/9459208)
-        bg = Image.new("RGBA", im.size, bg_colour + (255,))
-        bg.paste(im, mask=alpha)
-        return bg
-
-    else:
-        return im
-
-
-def slice_per(source, step):
-    return [source[i::step] for i in range(step)]
-
-
-def flatten(li):
-    return [item for sublist in li for item in sublist]
-
-
-def convert(in_file, output):
-    image = Image.open(in_file)
-
-    image = remove_transparency(image, (0, 0, 0))
-    image = image.convert("RGB")
-
-    raw_data = slice_per(list(image.getdata()), 32)
-
-    for yi, y in enumerate(raw_data):
-        for xi, x in enumerate(y):
-            threshold = 100
-
-            if statistics.mean(x) > threshold:
-                raw_data[yi][xi] = (255, 255, 255)
-            else:
-                raw_data[yi][xi] = (0, 0, 0)
-
-    image = Image.new(image.mode, image.size)
-    image.putdata(flatten(raw_data))
-    image = image.rotate(-90)
-    image = ImageOps.mirror(image)
-
-    data = list(image.getdata())
-
-    for index, pixel in enumerate(data):
-        if pixel == (255, 255, 255):
-            data[index] = 0x01
-        else:
-            data[index] = 0x00
-
-    data.insert(0, 1)
-
-    with open(output, "wb") as file:
-        file.write(bytes(data))
+if args.depth > 1 and args.dither != 'none':
+    parser.error("--dither makes 1 bit pages, it can't be combined with --depth")
+dmdprofile.enable_from_args(args)
 
 
 if __name__ == "__main__":
-    convert(args.input, args.output)
+    convert_path(args.input, args.output, threshold=100, version=FORMAT_V2 if args.legacy else FORMAT_V3,
+                 size=args.size, policy=args.resize, dither=args.dither, depth=args.depth)